@@ -0,0 +1,20 @@
+import asyncio
+
+from fastapi import HTTPException
+
+from app.services._session_cache import get_loaded_session
+
+
+async def loaded_session(season: int, round_no: int, session_code: str):
+    """Loaded fastf1 session for the route's path params, shared with every other analysis route."""
+    try:
+        return await asyncio.to_thread(get_loaded_session, season, round_no, session_code)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def race_session(season: int, round_no: int):
+    try:
+        return await asyncio.to_thread(get_loaded_session, season, round_no, "R")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,3 +1,5 @@
+import asyncio
+
 from fastapi import APIRouter, HTTPException
 from app.services.sim_championship import simulate_season
 
@@ -5,8 +7,8 @@ router = APIRouter(prefix="/predict", tags=["predict"])
 
 
 @router.get("/championship/{season}")
-def predict_championship(season: int, sims: int = 80, upto_round: int | None = None, mode: str = "mc"):
+async def predict_championship(season: int, sims: int = 80, upto_round: int | None = None, mode: str = "mc"):
     try:
-        return simulate_season(season, sims=sims, upto_round=upto_round, mode=mode)
+        return await asyncio.to_thread(simulate_season, season, sims=sims, upto_round=upto_round, mode=mode)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException
+from app.api.deps import race_session
 from app.services.strategy import compute_strategy_intelligence
 
 router = APIRouter(prefix="/analysis", tags=["analysis"])
 
 
 @router.get("/strategy/{season}/{round_no}")
-def strategy(season: int, round_no: int):
+async def strategy(season: int, round_no: int, session=Depends(race_session)):
     try:
-        return compute_strategy_intelligence(season, round_no)
+        return await asyncio.to_thread(compute_strategy_intelligence, season, round_no, session=session)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
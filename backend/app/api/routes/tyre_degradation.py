@@ -1,12 +1,17 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException
+from app.api.deps import loaded_session
 from app.services.tyre_degradation import compute_tyre_degradation
 
 router = APIRouter(prefix="/analysis", tags=["analysis"])
 
 
 @router.get("/tyre-degradation/{season}/{round_no}/{session_code}/{driver}")
-def tyre_degradation(season: int, round_no: int, session_code: str, driver: str):
+async def tyre_degradation(season: int, round_no: int, session_code: str, driver: str, session=Depends(loaded_session)):
     try:
-        return compute_tyre_degradation(season, round_no, session_code, driver.upper())
+        return await asyncio.to_thread(
+            compute_tyre_degradation, season, round_no, session_code, driver.upper(), session=session
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,8 +1,11 @@
-from fastapi import APIRouter
+import asyncio
+
+from fastapi import APIRouter, Depends
+from app.api.deps import loaded_session
 from app.services.tyres import load_tyre_stints
 
 router = APIRouter(prefix="/analysis", tags=["analysis"])
 
 @router.get("/tyres/{season}/{round_no}/{session_code}")
-def tyres(season: int, round_no: int, session_code: str):
-    return load_tyre_stints(season, round_no, session_code)
+async def tyres(season: int, round_no: int, session_code: str, session=Depends(loaded_session)):
+    return await asyncio.to_thread(load_tyre_stints, season, round_no, session_code, session=session)
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import os
+import pickle
+import re
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Any, Optional
+
+# Sits next to the FastF1 cache so a restart finds the derived results again
+DEFAULT_DISK_CACHE_DIR = os.environ.get("F1_DISK_CACHE", "../cache/derived")
+
+# The running season's derived data is refreshed after this long
+CURRENT_SEASON_TTL_S = 6 * 3600
+
+_MISS = object()
+
+
+def cache_path(name: str, *key: Any) -> Path:
+    stem = "_".join(re.sub(r"[^A-Za-z0-9.-]+", "-", str(k)) for k in key)
+    return Path(DEFAULT_DISK_CACHE_DIR) / name / f"{stem}.pkl"
+
+
+def season_max_age(season: int) -> Optional[float]:
+    """Finished seasons never change; the running one is refreshed periodically."""
+    return None if season < date.today().year else CURRENT_SEASON_TTL_S
+
+
+def load_pickle(path: Path, max_age_s: Optional[float] = None) -> Any:
+    """
+    Return the pickled object at `path`, or the module's _MISS sentinel if it is
+    absent, unreadable or older than `max_age_s` (None = never expires).
+    """
+    try:
+        if max_age_s is not None and time.time() - path.stat().st_mtime > max_age_s:
+            return _MISS
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        return _MISS
+
+
+def dump_pickle(path: Path, obj: Any) -> None:
+    """Write atomically (tmp + rename) so concurrent readers never see a partial file."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except Exception:
+        pass
+
+
+def is_miss(obj: Any) -> bool:
+    return obj is _MISS
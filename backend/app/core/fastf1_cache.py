@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+
+import fastf1
+
+# The API runs from backend/ and shares one cache dir with the other checkouts
+DEFAULT_CACHE_DIR = os.environ.get("FASTF1_CACHE", "../cache/fastf1")
+
+
+@lru_cache(maxsize=None)
+def init_fastf1_cache(cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    """
+    Enable the FastF1 disk cache once per process (per directory).
+    Safe to call from every module import and from pool worker initializers.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    fastf1.Cache.enable_cache(cache_dir)
+    return cache_dir
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into one blocking call run
+    in a worker thread; every waiter gets the same result (or exception).
+    """
+
+    def __init__(self, window_s: float = 0.005):
+        # short pre-wait so near-simultaneous requests join the same flight
+        self.window_s = window_s
+        self._pending: Dict[Hashable, asyncio.Task] = {}
+
+    async def _run(self, key: Hashable, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        try:
+            await asyncio.sleep(self.window_s)
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        finally:
+            self._pending.pop(key, None)
+
+    async def do(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, fn, args, kwargs))
+            # nobody may be left to await it if every client disconnects
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._pending[key] = task
+        # shield: one client going away must not cancel the shared call
+        return await asyncio.shield(task)
@@ -1,22 +1,115 @@
 from __future__ import annotations
+import asyncio
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from fastapi import FastAPI, Request, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+import fastf1
+import orjson
+import pandas as pd
+
 from app.api.routes.tyres import router as tyres_router
 from app.api.routes.strategy import router as strategy_router
 from app.api.routes.tyre_degradation import router as tyre_deg_router
-
-from fastapi import FastAPI
 from app.api.routes.predict import router as predict_router
 from app.api.routes.championship import router as championship_router
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List
+from app.core.fastf1_cache import init_fastf1_cache
+from app.schemas.options import RaceInfo, RaceList, SeasonList, SessionList
+from app.services._session_cache import clear_session_cache
+from app.services.predict_results import _build_strength_from_season, warm_prediction_caches
+from app.services.weather_evolution import load_weather_and_tei
 
-import fastf1
+# fastf1 loads block on network/parquet I/O; give them their own pool so they
+# don't starve the default one
+FASTF1_MAX_WORKERS = 16
+
+
+# Warm the predictor's strength table and this season's sessions in the
+# background at startup (set PREDICT_WARM=0 to skip, e.g. offline)
+PREDICT_WARM_ON_STARTUP = os.environ.get("PREDICT_WARM", "1") != "0"
+
+
+# Schedules only change when FIA reshuffles the calendar; refresh once a day
+SCHEDULE_CACHE_TTL_S = 24 * 60 * 60
+
+
+@lru_cache(maxsize=16)
+def _cached_schedule(season: int) -> pd.DataFrame:
+    return fastf1.get_event_schedule(season)
+
+
+# /options/* bodies are precomputed; clients and proxies may reuse them for this long
+OPTIONS_MAX_AGE_S = 3600
+
+# (json body, etag) keyed by URL path, e.g. "/options/races/2024"
+OPTIONS_CACHE: dict[str, tuple[bytes, str]] = {}
+
+
+def _options_entry(model: BaseModel) -> tuple[bytes, str]:
+    body = orjson.dumps(model.model_dump())
+    return body, f'"{hashlib.md5(body).hexdigest()}"'
+
+
+def _cached_json(request: Request, entry: tuple[bytes, str]) -> Response:
+    body, etag = entry
+    headers = {"Cache-Control": f"public, max-age={OPTIONS_MAX_AGE_S}", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _warm_options_cache() -> None:
+    season_list = _season_list()
+    OPTIONS_CACHE["/options/seasons"] = _options_entry(season_list)
+    for season in season_list.seasons:
+        race_list = _load_race_list(season)
+        if race_list.races:
+            OPTIONS_CACHE[f"/options/races/{season}"] = _options_entry(race_list)
+
+
+async def _clear_caches_periodically() -> None:
+    while True:
+        await asyncio.sleep(SCHEDULE_CACHE_TTL_S)
+        _cached_schedule.cache_clear()
+        OPTIONS_CACHE.clear()
+        _build_strength_from_season.cache_clear()
+        # a weekend's sessions may have been parsed before their data was complete
+        clear_session_cache()
+        await asyncio.to_thread(_warm_options_cache)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # enable the FastF1 disk cache once, before anything loads a session
+    init_fastf1_cache()
+    executor = ThreadPoolExecutor(max_workers=FASTF1_MAX_WORKERS, thread_name_prefix="fastf1")
+    asyncio.get_running_loop().set_default_executor(executor)
+    warm_task = asyncio.create_task(asyncio.to_thread(_warm_options_cache))
+    cache_task = asyncio.create_task(_clear_caches_periodically())
+    predict_task = (
+        asyncio.create_task(asyncio.to_thread(warm_prediction_caches)) if PREDICT_WARM_ON_STARTUP else None
+    )
+    yield
+    warm_task.cancel()
+    cache_task.cancel()
+    if predict_task is not None:
+        predict_task.cancel()
+    executor.shutdown(wait=False, cancel_futures=True)
 
-fastf1.Cache.enable_cache("../cache/fastf1")
 
 app = FastAPI(
     title="F1 Replay & Prediction API",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
+    # orjson is much faster than stdlib json on the multi-KB analysis payloads
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -26,24 +119,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-class SeasonList(BaseModel):
-    seasons: List[int]
-
-class RaceInfo(BaseModel):
-    round: int
-    raceName: str
-
-    date: str | None = None
-class RaceList(BaseModel):
-    season: int
-    races: List[RaceInfo]
-
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 @app.get("/options/seasons", response_model=SeasonList)
-def seasons():
+def seasons(request: Request):
+    key = "/options/seasons"
+    entry = OPTIONS_CACHE.get(key)
+    if entry is None:
+        entry = OPTIONS_CACHE[key] = _options_entry(_season_list())
+    return _cached_json(request, entry)
+
+
+def _season_list() -> SeasonList:
     """
     Return a stable list of seasons:
     - includes current year and next year for "upcoming predictions"
@@ -58,8 +147,24 @@ def seasons():
 
 
 
+def _first_col(df: pd.DataFrame, *names: str) -> str | None:
+    return next((c for c in names if c in df.columns), None)
+
+
 @app.get("/options/races/{season}", response_model=RaceList)
-def races(season: int):
+async def races(season: int, request: Request):
+    key = f"/options/races/{season}"
+    entry = OPTIONS_CACHE.get(key)
+    if entry is None:
+        race_list = await asyncio.to_thread(_load_race_list, season)
+        if not race_list.races:
+            # schedule not available (yet); don't pin the empty fallback
+            return race_list
+        entry = OPTIONS_CACHE[key] = _options_entry(race_list)
+    return _cached_json(request, entry)
+
+
+def _load_race_list(season: int) -> RaceList:
     """
     Return race list with optional ISO date (YYYY-MM-DD) if available.
 
@@ -69,104 +174,39 @@ def races(season: int):
       In that case we fall back to an empty list (but NOT a 500).
     """
     try:
-        schedule = fastf1.get_event_schedule(season)
+        schedule = _cached_schedule(season)
     except Exception:
         # Don't crash the UI — just return empty.
         return RaceList(season=season, races=[])
 
-    races: list[RaceInfo] = []
-
-    for _, row in schedule.iterrows():
-        # Round number (handle different column naming)
-        rnd = row.get("RoundNumber", None)
-        if rnd is None:
-            rnd = row.get("Round", None)
-        if rnd is None:
-            continue
-
-        try:
-            round_num = int(rnd)
-        except Exception:
-            continue
-
-        # Filter non-race placeholders (testing etc.)
-        name = row.get("EventName", None) or row.get("Event", None) or "Unknown GP"
-        name_s = str(name)
-        if round_num <= 0:
-            continue
-        if "testing" in name_s.lower():
-            continue
-
-        # Date (best-effort)
-        dt = row.get("EventDate", None) or row.get("Date", None)
-        iso = None
-        if dt is not None:
-            try:
-                # pandas.Timestamp -> python datetime -> ISO date
-                iso = dt.to_pydatetime().date().isoformat()
-            except Exception:
-                try:
-                    # already a date/datetime-like
-                    iso = str(dt)[:10]
-                except Exception:
-                    iso = None
-
-        races.append(RaceInfo(round=round_num, raceName=name_s, date=iso))
-
-    races.sort(key=lambda x: x.round)
-    return RaceList(season=season, races=races)
-
-
-
-    races = []
-    for _, row in schedule.iterrows():
-        # Round
-        rnd = None
-        if "RoundNumber" in row:
-            rnd = row.get("RoundNumber")
-        elif "Round" in row:
-            rnd = row.get("Round")
-        if rnd is None:
-            continue
-
-        # Name
-        name = None
-        if "EventName" in row:
-            name = row.get("EventName")
-        elif "Event" in row:
-            name = row.get("Event")
-        if not name:
-            name = "Unknown GP"
-
-        # Date
-        dt = None
-        if "EventDate" in row:
-            dt = row.get("EventDate")
-        elif "Date" in row:
-            dt = row.get("Date")
-
-        date_iso = None
-        try:
-            if dt is not None:
-                # pandas Timestamp or datetime
-                if hasattr(dt, "date"):
-                    date_iso = str(dt.date())
-                else:
-                    date_iso = str(dt)
-                if " " in date_iso:
-                    date_iso = date_iso.split(" ")[0]
-        except Exception:
-            date_iso = None
-
-        races.append({"round": int(rnd), "raceName": str(name), "date": date_iso})
-
-    races.sort(key=lambda x: x["round"])
-    return {"season": season, "races": races}
-
-class SessionList(BaseModel):
-    season: int
-    round: int
-    sessions: List[str]
+    # Column naming differs between fastf1 versions
+    round_col = _first_col(schedule, "RoundNumber", "Round")
+    name_col = _first_col(schedule, "EventName", "Event")
+    date_col = _first_col(schedule, "EventDate", "Date")
+    if round_col is None:
+        return RaceList(season=season, races=[])
+
+    df = pd.DataFrame({"round": pd.to_numeric(schedule[round_col], errors="coerce")})
+    df["raceName"] = (
+        schedule[name_col].fillna("").astype(str).replace("", "Unknown GP")
+        if name_col is not None else "Unknown GP"
+    )
+    if date_col is not None:
+        # best-effort ISO date (YYYY-MM-DD); unparseable dates become None
+        dates = pd.to_datetime(schedule[date_col], errors="coerce").dt.strftime("%Y-%m-%d")
+        df["date"] = dates.astype(object).where(dates.notna(), None)
+    else:
+        df["date"] = None
+
+    # Filter non-race placeholders (testing etc.)
+    df = df[df["round"].fillna(0) > 0]
+    df = df[~df["raceName"].str.lower().str.contains("testing", na=False)]
+    df["round"] = df["round"].astype(int)
+
+    # rows are built and typed above; skip per-row pydantic validation
+    races = [RaceInfo.model_construct(**r) for r in df.sort_values("round").to_dict("records")]
+    return RaceList.model_construct(season=season, races=races)
+
 
 @app.get("/options/sessions/{season}/{round}", response_model=SessionList)
 def sessions(season: int, round: int):
@@ -175,17 +215,19 @@ def sessions(season: int, round: int):
     return SessionList(season=season, round=round, sessions=base)
 
 
-
-
-from app.services.weather_evolution import load_weather_and_tei
-
 @app.get("/analysis/weather-evolution/{season}/{round}/{session}")
-def weather_evolution(season: int, round: int, session: str):
-    return load_weather_and_tei(season, round, session)
+async def weather_evolution(season: int, round: int, session: str):
+    return await asyncio.to_thread(load_weather_and_tei, season, round, session)
+
 
 app.include_router(tyres_router)
 app.include_router(strategy_router)
 app.include_router(tyre_deg_router)
-
 app.include_router(predict_router)
 app.include_router(championship_router)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("app.main:app", loop="uvloop", http="httptools")
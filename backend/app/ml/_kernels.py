@@ -0,0 +1,171 @@
+"""
+Numba kernels shared by the dataset/feature scripts and the prediction services.
+
+Everything here is compiled eagerly from explicit signatures and cached on
+disk next to this module, so only the very first run pays the JIT cost.
+Without numba the same functions run as plain python/numpy.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional; the kernels below run as plain python too
+    prange = range
+
+    def njit(*args, **kwargs):
+        def wrap(fn):
+            return fn
+        return wrap
+
+# fastmath without nnan/ninf: the rolling kernel relies on NaN checks
+_FASTMATH = {"nsz", "arcp", "contract", "afn", "reassoc"}
+_OPTS = dict(cache=True, fastmath=_FASTMATH, boundscheck=False)
+
+
+@njit("f8[:](f8[:])", **_OPTS)
+def softmax(scores: np.ndarray) -> np.ndarray:
+    # max-subtracted exp-normalise, one loop each for the max, the exps and the scale
+    n = scores.size
+    out = np.empty(n)
+    if n == 0:
+        return out
+    m = scores[0]
+    for i in range(1, n):
+        if scores[i] > m:
+            m = scores[i]
+    total = 0.0
+    for i in range(n):
+        out[i] = np.exp(scores[i] - m)
+        total += out[i]
+    for i in range(n):
+        out[i] /= total
+    return out
+
+
+@njit("f8[:](f8[:])", **_OPTS)
+def inverse_position_scores(pos: np.ndarray) -> np.ndarray:
+    # 1 / max(position, 1): P1 scores 1.0, P2 0.5, ...
+    out = np.empty(pos.size)
+    for i in range(pos.size):
+        out[i] = 1.0 / max(pos[i], 1.0)
+    return out
+
+
+@njit("f8(f8[:], f8)", **_OPTS)
+def sorted_quantile(s: np.ndarray, q: float) -> float:
+    # linear interpolation on an already sorted array (same as np.quantile's default)
+    pos = q * (s.size - 1)
+    lo = int(np.floor(pos))
+    hi = min(lo + 1, s.size - 1)
+    return s[lo] + (s[hi] - s[lo]) * (pos - lo)
+
+
+@njit("f8(f8[:], f8, f8)", **_OPTS)
+def quick_pace(laptimes_s: np.ndarray, quick_q: float, outlier_s: float) -> float:
+    # median of the quick laps after dropping > median + outlier_s; NaN if too few laps
+    if laptimes_s.size == 0:
+        return np.nan
+    s = np.sort(laptimes_s)
+    med = sorted_quantile(s, 0.5)
+    s = s[s <= med + outlier_s]
+    if s.size < 3:
+        return np.nan
+    q = sorted_quantile(s, quick_q)
+    quick = s[s <= q]
+    if quick.size < 3:
+        return np.nan
+    return sorted_quantile(quick, 0.5)
+
+
+@njit("Tuple((f8[:], i8[:]))(i8[:], f8[:], f8, f8, i8)", **_OPTS)
+def race_pace(starts: np.ndarray, lap_s: np.ndarray, quick_quantile: float, outlier_seconds: float, min_laps: int):
+    # lap_s holds every driver's laps as contiguous ascending runs lap_s[starts[g]:starts[g + 1]]
+    n = starts.size - 1
+    pace = np.full(n, np.nan)
+    used = np.zeros(n, dtype=np.int64)
+    for g in range(n):
+        s = lap_s[starts[g]:starts[g + 1]]
+        used[g] = s.size
+        if s.size < min_laps:
+            continue
+        med = sorted_quantile(s, 0.5)
+        s = s[:np.searchsorted(s, med + outlier_seconds, side="right")]
+        used[g] = s.size
+        if s.size < min_laps:
+            continue
+        q = sorted_quantile(s, quick_quantile)
+        quick = s[:np.searchsorted(s, q, side="right")]
+        used[g] = quick.size
+        if quick.size < min_laps:
+            continue
+        pace[g] = sorted_quantile(quick, 0.5)
+    return pace, used
+
+
+@njit(["Tuple((f8[:], f8[:], f8[:]))(i8[:], f4[:], f4[:])",
+       "Tuple((f8[:], f8[:], f8[:]))(i8[:], f8[:], f8[:])"], **_OPTS)
+def grouped_line_fit(starts: np.ndarray, x: np.ndarray, y: np.ndarray):
+    # closed-form least squares y = slope*x + intercept on every contiguous run
+    # x[starts[g]:starts[g + 1]]; sums are taken about the run means so ~90s lap
+    # times don't cancel. No spread in x -> slope 0, intercept mean(y), r2 0.
+    # Inputs may be float32 (lap numbers, ms lap times); accumulation is float64
+    n = starts.size - 1
+    slope = np.zeros(n)
+    intercept = np.zeros(n)
+    r2 = np.zeros(n)
+    for g in range(n):
+        lo, hi = starts[g], starts[g + 1]
+        m = hi - lo
+        if m == 0:
+            intercept[g] = np.nan
+            continue
+        mx = 0.0
+        my = 0.0
+        for i in range(lo, hi):
+            mx += x[i]
+            my += y[i]
+        mx /= m
+        my /= m
+        sxx = 0.0
+        sxy = 0.0
+        syy = 0.0
+        for i in range(lo, hi):
+            dx = x[i] - mx
+            dy = y[i] - my
+            sxx += dx * dx
+            sxy += dx * dy
+            syy += dy * dy
+        if sxx > 0.0:
+            slope[g] = sxy / sxx
+            if syy > 0.0:
+                r2[g] = sxy * sxy / (sxx * syy)
+        intercept[g] = my - slope[g] * mx
+    return slope, intercept, r2
+
+
+@njit("f8[:, :](i8[:], f8[:, :], i8)", parallel=True, **_OPTS)
+def shift_rolling_mean(starts: np.ndarray, vals: np.ndarray, window: int) -> np.ndarray:
+    # groups are the contiguous row runs vals[starts[g]:starts[g + 1], :];
+    # every column is rolled in the same pass over the rows
+    n, k = vals.shape
+    out = np.full((n, k), np.nan)
+    for g in prange(starts.size - 1):
+        lo, hi = starts[g], starts[g + 1]
+        total = np.zeros(k)
+        count = np.zeros(k, dtype=np.int64)
+        for i in range(lo, hi):
+            j = i - window
+            for c in range(k):
+                # window for row i is [i - window, i - 1]: shift(1) then rolling(window, min_periods=1)
+                if count[c] > 0:
+                    out[i, c] = total[c] / count[c]
+                v = vals[i, c]
+                if not np.isnan(v):
+                    total[c] += v
+                    count[c] += 1
+                if j >= lo and not np.isnan(vals[j, c]):
+                    total[c] -= vals[j, c]
+                    count[c] -= 1
+    return out
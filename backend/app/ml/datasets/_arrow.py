@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from typing import List
+
+import numpy as np
+import pyarrow as pa
+
+
+def left_join(left: pa.Table, right: pa.Table, keys: List[str]) -> pa.Table:
+    """
+    Arrow equivalent of left.merge(right, how="left", on=keys), keeping left row order.
+    """
+    # join keys must have identical types on both sides
+    right = right.cast(pa.schema([left.schema.field(c) if c in keys else right.schema.field(c) for c in right.column_names]))
+    left = left.append_column("_row", pa.array(np.arange(left.num_rows)))
+    out = left.join(right, keys=keys, join_type="left outer")
+    return out.sort_by("_row").drop_columns(["_row"])
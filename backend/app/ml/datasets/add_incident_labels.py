@@ -1,14 +1,43 @@
 from __future__ import annotations
 
 import os
-from typing import Dict, Any, List
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import fastf1
 
+from app.core.fastf1_cache import init_fastf1_cache
+from app.ml.datasets._arrow import left_join
+
 CACHE_DIR = "cache"
-os.makedirs(CACHE_DIR, exist_ok=True)
-fastf1.Cache.enable_cache(CACHE_DIR)
+init_fastf1_cache(CACHE_DIR)
+
+@lru_cache(maxsize=16)
+def _cached_schedule(season: int) -> pd.DataFrame:
+    return fastf1.get_event_schedule(season)
+
+
+def _load_race(season: int, round_no: int):
+    """
+    Race session with only race control messages loaded. Each round is loaded
+    once in its own worker, so there is nothing to cache and no lock to share.
+    """
+    r = fastf1.get_event(season, round_no).get_race()
+    r.load(laps=False, telemetry=False, weather=False, messages=True)
+    return r
+
+
+# One scan for all three labels. The lookahead lets overlapping hits be found,
+# e.g. "VIRTUAL SAFETY CAR" counts as both vsc and sc.
+_INCIDENT_PAT = re.compile(
+    r"(?=(?P<sc>SAFETY CAR|\bSC\b)|(?P<vsc>VSC|VIRTUAL SAFETY)|(?P<red>RED FLAG))",
+    re.IGNORECASE,
+)
 
 
 def _has_incident_from_messages(messages_df: pd.DataFrame) -> Dict[str, int]:
@@ -21,103 +50,146 @@ def _has_incident_from_messages(messages_df: pd.DataFrame) -> Dict[str, int]:
 
     # FastF1 RCM columns vary; we safely search text
     text_cols = [c for c in messages_df.columns if c.lower() in ("message", "category", "flag", "status")]
-    if not text_cols:
-        # fallback: stringify whole rows
-        combined = messages_df.astype(str).agg(" ".join, axis=1).str.upper()
-    else:
-        combined = messages_df[text_cols].astype(str).agg(" ".join, axis=1).str.upper()
+    # fallback: stringify whole rows
+    frame = messages_df[text_cols] if text_cols else messages_df
+    text = "\x00".join(frame.astype(str).to_numpy().ravel())
 
-    has_sc = int(combined.str.contains("SAFETY CAR").any() or combined.str.contains(r"\bSC\b").any())
-    has_vsc = int(combined.str.contains("VSC").any() or combined.str.contains("VIRTUAL SAFETY").any())
-    has_red = int(combined.str.contains("RED FLAG").any())
+    found = {m.lastgroup for m in _INCIDENT_PAT.finditer(text)}
+    has_sc = int("sc" in found)
+    has_vsc = int("vsc" in found)
+    has_red = int("red" in found)
 
     incident = int((has_sc or has_vsc or has_red) == 1)
     return {"sc": has_sc, "vsc": has_vsc, "red": has_red, "incident": incident}
 
 
-def build_incident_table(seasons: List[int]) -> pd.DataFrame:
-    rows: List[Dict[str, Any]] = []
+def _init_worker() -> None:
+    init_fastf1_cache(CACHE_DIR)
+
+
+def _process_round(season: int, round_no: int, event_name: str) -> Dict[str, Any]:
+    try:
+        r = _load_race(season, round_no)
+    except Exception as e:
+        return {
+            "season": season,
+            "round": round_no,
+            "event": event_name,
+            "sc": 0,
+            "vsc": 0,
+            "red_flag": 0,
+            "incident": 0,
+            "error": f"race_load_failed: {e}",
+        }
+
+    try:
+        messages = getattr(r, "race_control_messages", None)
+        if messages is None:
+            # fallback attempt
+            messages = getattr(r, "race_control_messages_data", None)
+        info = _has_incident_from_messages(messages)
+        return {
+            "season": season,
+            "round": round_no,
+            "event": event_name,
+            "sc": info["sc"],
+            "vsc": info["vsc"],
+            "red_flag": info["red"],
+            "incident": info["incident"],
+            "error": None,
+        }
+    except Exception as e:
+        return {
+            "season": season,
+            "round": round_no,
+            "event": event_name,
+            "sc": 0,
+            "vsc": 0,
+            "red_flag": 0,
+            "incident": 0,
+            "error": f"message_parse_failed: {e}",
+        }
+
+
+INCIDENT_SCHEMA = pa.schema([
+    ("season", pa.int32()),
+    ("round", pa.int32()),
+    ("event", pa.string()),
+    ("sc", pa.int8()),
+    ("vsc", pa.int8()),
+    ("red_flag", pa.int8()),
+    ("incident", pa.int8()),
+    ("error", pa.string()),
+])
+
+
+def build_incident_table(seasons: List[int], out_path: str, max_workers: Optional[int] = None) -> None:
+    """
+    Writes one row per race to out_path. Each season becomes its own row group
+    as soon as its last race finishes, so memory is bounded by one season.
+    """
+    pending: Dict[int, List[Dict[str, Any]]] = {}
+    remaining: Dict[int, int] = {}
+    tasks: List[Tuple[int, int, str]] = []
 
-    for season in seasons:
-        try:
-            schedule = fastf1.get_event_schedule(season)
-            schedule = schedule[schedule["RoundNumber"].fillna(0).astype(int) > 0]
-        except Exception as e:
-            rows.append({"season": season, "round": None, "error": f"schedule_failed: {e}"})
-            continue
+    with pq.ParquetWriter(out_path, INCIDENT_SCHEMA) as writer:
 
-        for _, ev in schedule.iterrows():
-            round_no = int(ev["RoundNumber"])
-            event_name = str(ev["EventName"])
+        def flush(season: int) -> None:
+            writer.write_table(pa.Table.from_pylist(pending.pop(season), schema=INCIDENT_SCHEMA))
 
+        for season in seasons:
             try:
-                event = fastf1.get_event(season, round_no)
-                r = event.get_race()
-                r.load(messages=True, weather=False)
+                schedule = _cached_schedule(season)
+                schedule = schedule[schedule["RoundNumber"].fillna(0).astype(int) > 0]
             except Exception as e:
-                rows.append({
-                    "season": season,
-                    "round": round_no,
-                    "event": event_name,
-                    "sc": 0,
-                    "vsc": 0,
-                    "red_flag": 0,
-                    "incident": 0,
-                    "error": f"race_load_failed: {e}",
-                })
+                pending[season] = [{"season": season, "round": None, "error": f"schedule_failed: {e}"}]
+                flush(season)
                 continue
 
-            try:
-                messages = getattr(r, "race_control_messages", None)
-                if messages is None:
-                    # fallback attempt
-                    messages = getattr(r, "race_control_messages_data", None)
-                info = _has_incident_from_messages(messages)
-                rows.append({
-                    "season": season,
-                    "round": round_no,
-                    "event": event_name,
-                    "sc": info["sc"],
-                    "vsc": info["vsc"],
-                    "red_flag": info["red"],
-                    "incident": info["incident"],
-                    "error": None,
-                })
-            except Exception as e:
-                rows.append({
-                    "season": season,
-                    "round": round_no,
-                    "event": event_name,
-                    "sc": 0,
-                    "vsc": 0,
-                    "red_flag": 0,
-                    "incident": 0,
-                    "error": f"message_parse_failed: {e}",
-                })
-
-    return pd.DataFrame(rows)
+            rounds = schedule["RoundNumber"].astype(int).tolist()
+            names = schedule["EventName"].astype(str).tolist()
+            if not rounds:
+                continue
+            pending[season] = []
+            remaining[season] = len(rounds)
+            tasks.extend((season, round_no, event_name) for round_no, event_name in zip(rounds, names))
+
+        # every race load is independent, so fan them out across processes
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=_init_worker) as ex:
+            futures = [ex.submit(_process_round, *t) for t in tasks]
+            for f in as_completed(futures):
+                row = f.result()
+                season = row["season"]
+                pending[season].append(row)
+                remaining[season] -= 1
+                if remaining[season] == 0:
+                    flush(season)
 
 
 def main():
     in_path = "data/ml/driver_event_table_v1.parquet"
-    df = pd.read_parquet(in_path)
-
-    seasons = sorted([int(x) for x in df["season"].dropna().unique().tolist()])
-    inc = build_incident_table(seasons)
-
-    # merge labels back to driver-event table (broadcast to all drivers in same race)
-    out = df.merge(
-        inc[["season", "round", "sc", "vsc", "red_flag", "incident"]],
-        how="left",
-        left_on=["season", "round"],
-        right_on=["season", "round"],
+    # planning only needs the seasons; the full table is read at merge time
+    plan = pd.read_parquet(in_path, columns=["season"], engine="pyarrow")
+
+    seasons = sorted([int(x) for x in plan["season"].dropna().unique().tolist()])
+    inc_path = "data/ml/race_incidents_v1.parquet"
+    build_incident_table(seasons, inc_path)
+
+    # merge labels back to driver-event table (broadcast to all drivers in same race);
+    # done in Arrow so the wide table never becomes a pandas frame. Label columns
+    # stay int8 from INCIDENT_SCHEMA (null where the race had no incident row).
+    out = left_join(
+        pq.read_table(in_path),
+        pq.read_table(inc_path, columns=["season", "round", "sc", "vsc", "red_flag", "incident"]),
+        keys=["season", "round"],
     )
 
     out_path = "data/ml/driver_event_table_v1_1_incidents.parquet"
-    out.to_parquet(out_path, index=False)
+    pq.write_table(out, out_path, compression="zstd", use_dictionary=True)
 
     print(f"✅ Saved: {out_path}")
-    print(out[["season","round","driver","incident","sc","vsc","red_flag"]].dropna().head(20).to_string(index=False))
+    cols = ["season","round","driver","incident","sc","vsc","red_flag"]
+    print(out.select(cols).to_pandas().dropna().head(20).to_string(index=False))
 
 
 if __name__ == "__main__":
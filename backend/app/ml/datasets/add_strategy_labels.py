@@ -1,58 +1,88 @@
 from __future__ import annotations
 
-import os
 from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import fastf1
 
-CACHE_DIR = "cache"
-os.makedirs(CACHE_DIR, exist_ok=True)
-fastf1.Cache.enable_cache(CACHE_DIR)
-
+from app.core.fastf1_cache import init_fastf1_cache
+from app.ml.datasets._arrow import left_join
+from app.ml._kernels import quick_pace
 
-def _to_seconds(x) -> Optional[float]:
-    if x is None:
-        return None
-    try:
-        return float(pd.to_timedelta(x).total_seconds())
-    except Exception:
-        return None
+CACHE_DIR = "cache"
+init_fastf1_cache(CACHE_DIR)
 
 
 def _robust_quick_pace(laptimes_s: np.ndarray, quick_q: float = 0.75, outlier_s: float = 7.0) -> Optional[float]:
     if laptimes_s is None or len(laptimes_s) == 0:
         return None
-    med = float(np.median(laptimes_s))
-    laptimes_s = laptimes_s[laptimes_s <= med + outlier_s]
-    if len(laptimes_s) < 3:
-        return None
-    q = float(np.quantile(laptimes_s, quick_q))
-    quick = laptimes_s[laptimes_s <= q]
-    if len(quick) < 3:
-        return None
-    return float(np.median(quick))
-
-
-def _linear_deg_slope(lap_idx: np.ndarray, laptimes_s: np.ndarray) -> Tuple[Optional[float], Optional[float]]:
+    pace = quick_pace(np.ascontiguousarray(laptimes_s, dtype=np.float64), quick_q, outlier_s)
+    return None if np.isnan(pace) else float(pace)
+
+
+def _stint_deg_slopes(
+    stint: np.ndarray,
+    lap_no: np.ndarray,
+    lap_s: np.ndarray,
+    quick_q: float = 0.75,
+    outlier_s: float = 7.0,
+    min_stint_laps: int = 6,
+    min_fit_laps: int = 5,
+) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Returns (slope_sec_per_lap, r2)
+    Returns (slope_sec_per_lap, r2) arrays, one entry per usable stint.
+
+    Single pass over all laps: sort by (stint, lap time) so each stint is a
+    contiguous sorted segment, read medians/quantiles by index and get the
+    least-squares sums from np.add.reduceat.
     """
-    if len(lap_idx) < 5:
-        return None, None
-    x = lap_idx.astype(float)
-    y = laptimes_s.astype(float)
-    # simple linear fit
-    a, b = np.polyfit(x, y, 1)
-    yhat = a * x + b
-    ss_res = float(np.sum((y - yhat) ** 2))
-    ss_tot = float(np.sum((y - np.mean(y)) ** 2)) or 1.0
-    r2 = 1.0 - ss_res / ss_tot
-    return float(a), float(r2)
-
-
-def extract_driver_strategy_features(season: int, round_no: int) -> pd.DataFrame:
+    if len(lap_s) == 0:
+        return np.empty(0), np.empty(0)
+
+    order = np.lexsort((lap_s, stint))
+    stint = stint[order]
+    x = lap_no[order].astype(float)
+    y = lap_s[order].astype(float)
+
+    starts = np.flatnonzero(np.r_[True, stint[1:] != stint[:-1]])
+    counts = np.diff(np.r_[starts, len(y)])
+    seg = np.repeat(np.arange(len(starts)), counts)
+
+    def seg_quantile(n: np.ndarray, q: float) -> np.ndarray:
+        # quantile of the first n (sorted) laps of each segment
+        n = np.maximum(n, 1)
+        pos = q * (n - 1)
+        lo = np.floor(pos).astype(int)
+        hi = np.minimum(lo + 1, n - 1)
+        return y[starts + lo] + (y[starts + hi] - y[starts + lo]) * (pos - lo)
+
+    # same acceptance rule as _robust_quick_pace (outlier cut, then quick laps)
+    keep = y <= seg_quantile(counts, 0.5)[seg] + outlier_s
+    n_keep = np.add.reduceat(keep, starts)
+    quick = keep & (y <= seg_quantile(n_keep, quick_q)[seg])
+    n_quick = np.add.reduceat(quick, starts)
+
+    # fit on the quick laps of the stint
+    m = (y <= seg_quantile(counts, quick_q)[seg]).astype(float)
+    n = np.add.reduceat(m, starts)
+    sx = np.add.reduceat(m * x, starts)
+    sy = np.add.reduceat(m * y, starts)
+    sxx = np.add.reduceat(m * x * x, starts) - sx * sx / np.maximum(n, 1)
+    sxy = np.add.reduceat(m * x * y, starts) - sx * sy / np.maximum(n, 1)
+    syy = np.add.reduceat(m * y * y, starts) - sy * sy / np.maximum(n, 1)
+
+    valid = (counts >= min_stint_laps) & (n_keep >= 3) & (n_quick >= 3) & (n >= min_fit_laps) & (sxx > 0)
+    sxx, sxy, syy = sxx[valid], sxy[valid], syy[valid]
+    slope = sxy / sxx
+    ss_res = syy - slope * sxy
+    r2 = 1.0 - ss_res / np.where(syy > 0, syy, 1.0)
+    return slope, r2
+
+
+def extract_driver_strategy_features(season: int, round_no: int) -> List[Dict[str, Any]]:
     """
     Builds per-driver strategy signals from the Race session:
     - pit stops from stints
@@ -65,22 +95,26 @@ def extract_driver_strategy_features(season: int, round_no: int) -> pd.DataFrame
 
     laps = r.laps
     if laps is None or len(laps) == 0:
-        return pd.DataFrame([])
+        return []
 
     # FastF1 has Stint, Compound columns in laps for races usually
     # We'll derive stints per driver: contiguous stint id
     drivers = sorted(list(set(laps["Driver"].dropna().unique().tolist())))
     rows: List[Dict[str, Any]] = []
+    # only these are used below; keeps the per-driver frames narrow
+    cols = [c for c in ("LapNumber", "LapTime", "Stint", "Compound") if c in laps.columns]
 
     for drv in drivers:
-        dl = laps.pick_drivers([drv])  # avoids deprecated pick_driver
-        dl = dl.dropna(subset=["LapNumber", "LapTime"])
+        dl = laps.pick_drivers([drv])[cols]  # avoids deprecated pick_driver
+        # convert the whole column once; LapSec is used by everything below
+        lap_td = pd.to_timedelta(dl["LapTime"], errors="coerce")
+        dl = dl.assign(LapSec=lap_td.dt.total_seconds()).dropna(subset=["LapNumber", "LapSec"])
         if len(dl) < 8:
             continue
 
         # detect pit laps via Stint changes
         if "Stint" in dl.columns:
-            stints = dl[["LapNumber", "Stint", "Compound"]].dropna(subset=["Stint"])
+            stints = dl[["LapNumber", "Stint"]].dropna(subset=["Stint"])
             stint_ids = stints["Stint"].astype(int)
             pit_laps = stints.loc[stint_ids.diff().fillna(0) != 0, "LapNumber"].astype(int).tolist()
         else:
@@ -93,48 +127,40 @@ def extract_driver_strategy_features(season: int, round_no: int) -> pd.DataFrame
         label_two_plus = 1 if num_stops >= 2 else 0
 
         # undercut proxy: compare quick pace in 3 laps before vs 3 laps after each pit
-        lapt_s = dl["LapTime"].apply(_to_seconds).dropna().astype(float).values
-        lapn = dl["LapNumber"].dropna().astype(int).values
+        lapt_s = dl["LapSec"].to_numpy(dtype=float)
+        lapn = dl["LapNumber"].astype(int).to_numpy()
+
+        # window bounds via binary search on sorted lap numbers (no per-pit masks)
+        order = np.argsort(lapn, kind="stable")
+        lapn_sorted = lapn[order]
+        lapt_sorted = lapt_s[order]
+        pit_arr = np.asarray(pit_laps, dtype=lapn_sorted.dtype)
+        pre_lo = np.searchsorted(lapn_sorted, pit_arr - 3, side="left")
+        pre_hi = np.searchsorted(lapn_sorted, pit_arr - 1, side="right")
+        post_lo = np.searchsorted(lapn_sorted, pit_arr + 1, side="left")
+        post_hi = np.searchsorted(lapn_sorted, pit_arr + 3, side="right")
 
         undercut_gains = []
-        for pl in pit_laps:
-            pre_mask = (lapn >= pl - 3) & (lapn <= pl - 1)
-            post_mask = (lapn >= pl + 1) & (lapn <= pl + 3)
-            pre = lapt_s[pre_mask] if pre_mask.any() else np.array([])
-            post = lapt_s[post_mask] if post_mask.any() else np.array([])
-            pre_p = _robust_quick_pace(pre) if len(pre) else None
-            post_p = _robust_quick_pace(post) if len(post) else None
+        for a, b, c, d in zip(pre_lo, pre_hi, post_lo, post_hi):
+            pre_p = _robust_quick_pace(lapt_sorted[a:b]) if b > a else None
+            post_p = _robust_quick_pace(lapt_sorted[c:d]) if d > c else None
             if pre_p is not None and post_p is not None:
                 undercut_gains.append(pre_p - post_p)  # positive = gained pace
 
         undercut_gain = float(np.max(undercut_gains)) if undercut_gains else 0.0
 
         # degradation proxy: compute per-stint slope using Stint column if available
-        deg_slopes = []
-        deg_r2s = []
+        deg_slopes = deg_r2s = np.empty(0)
         if "Stint" in dl.columns:
-            for stint_id, grp in dl.groupby("Stint"):
-                g = grp.dropna(subset=["LapNumber", "LapTime"])
-                if len(g) < 6:
-                    continue
-                lt = g["LapTime"].apply(_to_seconds).dropna().astype(float).values
-                ln = g["LapNumber"].dropna().astype(int).values
-                # focus on quick laps only
-                qp = _robust_quick_pace(lt)
-                if qp is None:
-                    continue
-                q = float(np.quantile(lt, 0.75))
-                ltq = lt[lt <= q]
-                lnq = ln[: len(ltq)]
-                if len(ltq) < 5:
-                    continue
-                slope, r2 = _linear_deg_slope(lnq, ltq)
-                if slope is not None:
-                    deg_slopes.append(slope)
-                    deg_r2s.append(r2 if r2 is not None else 0.0)
-
-        max_deg_slope = float(np.max(deg_slopes)) if deg_slopes else 0.0
-        avg_deg_r2 = float(np.mean(deg_r2s)) if deg_r2s else 0.0
+            st = dl.dropna(subset=["Stint"])
+            deg_slopes, deg_r2s = _stint_deg_slopes(
+                st["Stint"].to_numpy(dtype=float),
+                st["LapNumber"].to_numpy(dtype=float),
+                st["LapSec"].to_numpy(dtype=float),
+            )
+
+        max_deg_slope = float(np.max(deg_slopes)) if len(deg_slopes) else 0.0
+        avg_deg_r2 = float(np.mean(deg_r2s)) if len(deg_r2s) else 0.0
 
         # heuristic label: high degradation
         label_high_deg = 1 if max_deg_slope >= 0.06 else 0
@@ -152,43 +178,49 @@ def extract_driver_strategy_features(season: int, round_no: int) -> pd.DataFrame
             "label_high_deg": label_high_deg,
         })
 
-    return pd.DataFrame(rows)
+    return rows
 
 
 def main():
     in_path = "data/ml/driver_event_table_v1_1_incidents.parquet"
-    df = pd.read_parquet(in_path)
-
-    seasons = sorted([int(x) for x in df["season"].dropna().unique().tolist()])
-    rounds = df[["season", "round"]].dropna().drop_duplicates().sort_values(["season", "round"])
+    # planning only needs the race keys; the full table is read at merge time
+    plan = pd.read_parquet(in_path, columns=["season", "round"], engine="pyarrow")
+    rounds = plan.dropna().drop_duplicates().sort_values(["season", "round"])
 
-    all_rows = []
+    all_rows: List[Dict[str, Any]] = []
     for _, row in rounds.iterrows():
         season = int(row["season"])
         round_no = int(row["round"])
         try:
-            s = extract_driver_strategy_features(season, round_no)
-            if len(s) > 0:
-                all_rows.append(s)
+            all_rows.extend(extract_driver_strategy_features(season, round_no))
         except Exception as e:
             # skip race if API issues
             continue
 
-    strat = pd.concat(all_rows, ignore_index=True) if all_rows else pd.DataFrame([])
-
-    out = df.merge(
-        strat,
-        how="left",
-        left_on=["season", "round", "driver"],
-        right_on=["season", "round", "driver"],
+    # one DataFrame for the whole run instead of one per race + concat
+    strat = pd.DataFrame(all_rows).astype({
+        "stops": "int8",
+        "label_one_stop": "int8",
+        "label_two_plus": "int8",
+        "label_high_deg": "int8",
+        "undercut_gain_s": "float32",
+        "max_deg_slope_sec_per_lap": "float32",
+        "avg_deg_r2": "float32",
+    })
+
+    # done in Arrow so the wide table never becomes a pandas frame
+    out = left_join(
+        pq.read_table(in_path),
+        pa.Table.from_pandas(strat, preserve_index=False),
+        keys=["season", "round", "driver"],
     )
 
     out_path = "data/ml/driver_event_table_v1_2_strategy.parquet"
-    out.to_parquet(out_path, index=False)
+    pq.write_table(out, out_path, compression="zstd", use_dictionary=True)
 
     print(f"✅ Saved: {out_path}")
     cols = ["season","round","driver","stops","label_one_stop","label_two_plus","undercut_gain_s","max_deg_slope_sec_per_lap","label_high_deg"]
-    print(out[cols].dropna().head(20).to_string(index=False))
+    print(out.select(cols).to_pandas().dropna().head(20).to_string(index=False))
 
 
 if __name__ == "__main__":
@@ -1,17 +1,21 @@
 from __future__ import annotations
 
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Dict, List, Optional, Any, Tuple
 
 import numpy as np
 import pandas as pd
 import fastf1
 
+from app.core.fastf1_cache import init_fastf1_cache
+from app.ml._kernels import race_pace
+
 # Cache safety
 CACHE_DIR = "cache"
-os.makedirs(CACHE_DIR, exist_ok=True)
-fastf1.Cache.enable_cache(CACHE_DIR)
+init_fastf1_cache(CACHE_DIR)
 
 
 @dataclass
@@ -22,176 +26,288 @@ class BuildParams:
     min_race_laps: int = 6
 
 
-def _to_seconds(x) -> Optional[float]:
-    if x is None:
-        return None
-    try:
-        return float(pd.to_timedelta(x).total_seconds())
-    except Exception:
-        return None
-
-
-def _robust_race_pace_seconds(r_laps: pd.DataFrame, quick_quantile: float, outlier_seconds: float, min_laps: int) -> Tuple[Optional[float], int]:
+def _race_pace_by_driver(r_laps: pd.DataFrame, quick_quantile: float, outlier_seconds: float, min_laps: int) -> pd.DataFrame:
+    """
+    Robust race pace per driver in one pass over the race laps:
+    drop slow outliers (> median + outlier_seconds), keep the quickest
+    quick_quantile of the rest and take their median.
+    Returns race_pace_s (NaN if too few laps) and race_laps_used indexed by driver.
+    """
     if r_laps is None or len(r_laps) == 0:
-        return None, 0
-
-    lt = r_laps["LapTime"].dropna()
-    if len(lt) < min_laps:
-        return None, int(len(lt))
-
-    lap_s = lt.apply(_to_seconds).dropna().astype(float)
-    if len(lap_s) < min_laps:
-        return None, int(len(lap_s))
+        return pd.DataFrame({"race_pace_s": pd.Series(dtype="float64"), "race_laps_used": pd.Series(dtype="int64")})
+
+    # Driver is categorical in the event frames: its codes are the factorization (-1 = missing)
+    drv = r_laps["Driver"]
+    if not isinstance(drv.dtype, pd.CategoricalDtype):
+        drv = drv.astype("category")
+    codes = drv.cat.codes.to_numpy()
+    drivers = drv.cat.categories
+    lap_s = r_laps["LapTime_s"].to_numpy(dtype=np.float64, copy=False)
+    ok = (codes >= 0) & ~np.isnan(lap_s)
+    codes, lap_s = codes[ok], lap_s[ok]
+
+    # sort by (driver, lap time) so each driver is one ascending run
+    order = np.lexsort((lap_s, codes))
+    codes, lap_s = codes[order], lap_s[order]
+    starts = np.searchsorted(codes, np.arange(len(drivers) + 1))
+
+    pace, used = race_pace(starts.astype(np.int64), lap_s, quick_quantile, outlier_seconds, min_laps)
+    return pd.DataFrame({"race_pace_s": pace, "race_laps_used": used}, index=drivers.astype(str))
+
+
+# Column order of the output table. Rows are collected column-wise; the
+# label_* columns are derived from finish_pos / grid_pos at the end.
+TABLE_COLUMNS = (
+    "season", "round", "event", "driver", "team",
+    # features
+    "grid_pos", "quali_best_s",
+    # training-only (do NOT use for pre-race inference)
+    "race_pace_s", "race_laps_used",
+    # labels
+    "finish_pos",
+    "error",
+)
+LABEL_COLUMNS = ("label_win", "label_top3", "label_pole", "label_quali_top3")
+
+
+def _new_columns() -> Dict[str, List[Any]]:
+    return {k: [] for k in TABLE_COLUMNS}
+
+
+def _append_row(cols: Dict[str, List[Any]], **row: Any) -> None:
+    # every column gets a value so the lists stay aligned
+    for k, v in cols.items():
+        v.append(row.get(k))
+
+
+class _DataNotLoaded(RuntimeError):
+    pass
+
+
+# (quali laps, race laps, race results); laps have Driver + LapTime_s,
+# results have Abbreviation/TeamName/Position/GridPosition
+EventFrames = Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]
+
+SIDECAR_DIR = "data/ml/events"
+_RESULT_COLS = ("Abbreviation", "TeamName", "Position", "GridPosition")
+
+
+def _laps_frame(laps: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        "Driver": laps["Driver"].astype("category"),
+        "LapTime_s": pd.to_timedelta(laps["LapTime"], errors="coerce").dt.total_seconds(),
+    })
+
+
+def _results_frame(res: Optional[pd.DataFrame]) -> pd.DataFrame:
+    if res is None or len(res) == 0:
+        return pd.DataFrame({c: pd.Series(dtype=object) for c in _RESULT_COLS})
+    get = lambda c: res[c] if c in res.columns else pd.Series(None, index=res.index, dtype=object)
+    return pd.DataFrame({
+        "Abbreviation": get("Abbreviation").astype("category"),
+        "TeamName": get("TeamName"),
+        "Position": pd.to_numeric(get("Position"), errors="coerce").astype("Int32"),
+        "GridPosition": pd.to_numeric(get("GridPosition"), errors="coerce").astype("Int32"),
+    })
+
+
+@lru_cache(maxsize=None)
+def _load_event(season: int, round_no: int) -> EventFrames:
+    """
+    Load quali + race once and keep only the compact frames build_table needs.
+    """
+    event = fastf1.get_event(season, round_no)
+    q = event.get_qualifying()
+    r = event.get_race()
+
+    q.load(messages=False, weather=False)
+    r.load(messages=False, weather=False)
+
+    # Guard: sometimes FastF1 fails to load a session (0 drivers / no laps)
+    # In that case, skip this event instead of crashing the whole build.
+    if not getattr(q, '_laps', None) is not None and getattr(q, 'laps', None) is None:
+        raise RuntimeError('qualifying_laps_not_loaded')
+    if not getattr(r, '_laps', None) is not None and getattr(r, 'laps', None) is None:
+        raise RuntimeError('race_laps_not_loaded')
 
-    med = float(np.median(lap_s))
-    lap_s = lap_s[lap_s <= med + outlier_seconds]
-    if len(lap_s) < min_laps:
-        return None, int(len(lap_s))
-
-    q = float(np.quantile(lap_s, quick_quantile))
-    quick = lap_s[lap_s <= q]
-    if len(quick) < min_laps:
-        return None, int(len(quick))
+    try:
+        qlaps = q.laps
+        rlaps = r.laps
+    except Exception as e:
+        raise _DataNotLoaded(str(e)) from e
 
-    return float(np.median(quick)), int(len(quick))
+    # Grid position for race (from race result / laps data)
+    # FastF1: race.session_results has GridPosition and Position
+    try:
+        res = r.results  # DataFrame
+    except Exception:
+        res = None
+
+    return _laps_frame(qlaps), _laps_frame(rlaps), _results_frame(res)
+
+
+def _sidecar_path(season: int) -> str:
+    return os.path.join(SIDECAR_DIR, f"events_{season}.parquet")
+
+
+def _write_sidecar(season: int, frames: Dict[int, EventFrames]) -> None:
+    """
+    Persist a season's event frames in one long parquet so re-runs skip FastF1.
+    """
+    parts = []
+    for round_no, (qlaps, rlaps, res) in frames.items():
+        for kind, part in (("Q", qlaps), ("R", rlaps), ("res", res.rename(columns={"Abbreviation": "Driver"}))):
+            parts.append(part.astype({"Driver": object}).assign(round=round_no, kind=kind))
+    if not parts:
+        return
+    os.makedirs(SIDECAR_DIR, exist_ok=True)
+    pd.concat(parts, ignore_index=True).to_parquet(_sidecar_path(season), index=False, engine="pyarrow", compression="zstd")
+
+
+def _read_sidecar(season: int) -> Dict[int, EventFrames]:
+    path = _sidecar_path(season)
+    if not os.path.exists(path):
+        return {}
+    df = pd.read_parquet(path, engine="pyarrow")
+    df["Driver"] = df["Driver"].astype("category")
+
+    out: Dict[int, EventFrames] = {}
+    for round_no, ev in df.groupby("round", sort=False):
+        by_kind = {k: g for k, g in ev.groupby("kind", sort=False)}
+        empty = ev.iloc[:0]
+        qlaps, rlaps = (by_kind.get(k, empty)[["Driver", "LapTime_s"]].reset_index(drop=True) for k in ("Q", "R"))
+        res = by_kind.get("res", empty).rename(columns={"Driver": "Abbreviation"})[list(_RESULT_COLS)]
+        out[int(round_no)] = (qlaps, rlaps, res.reset_index(drop=True))
+    return out
+
+
+def _event_rows(season: int, round_no: int, event_name: str, frames: EventFrames, params: BuildParams) -> Dict[str, List[Any]]:
+    cols = _new_columns()
+    qlaps, rlaps, res = frames
+
+    # --- Qualifying features ---
+    # best lap time per driver
+    q_best = qlaps.dropna(subset=["Driver", "LapTime_s"]).groupby("Driver", observed=True)["LapTime_s"].min()
+    q_best.index = q_best.index.astype(str)
+
+    # --- Race labels + race training-only features ---
+
+    # drivers present in the race laps; categories inferred from strings are already sorted
+    rdrv = rlaps["Driver"]
+    if not isinstance(rdrv.dtype, pd.CategoricalDtype):
+        rdrv = rdrv.astype("category")
+    codes = rdrv.cat.codes.to_numpy()
+    drivers = rdrv.cat.categories[np.unique(codes[codes >= 0])].astype(str).tolist()
+
+    # one row per race driver, joined against results, race pace and quali best
+    ev = pd.DataFrame({"driver": drivers})
+    res = res[res["Abbreviation"].notna()]
+    res = res.assign(driver=res["Abbreviation"].astype(str))
+    res = res[res["driver"] != ""].drop_duplicates("driver", keep="last")
+    ev = ev.merge(res[["driver", "TeamName", "Position", "GridPosition"]], on="driver", how="left")
+
+    pace = _race_pace_by_driver(rlaps, params.quick_quantile, params.outlier_seconds, params.min_race_laps)
+    ev = ev.join(pace, on="driver")
+
+    n = len(ev)
+    cols["season"] = [season] * n
+    cols["round"] = [round_no] * n
+    cols["event"] = [event_name] * n
+    cols["driver"] = ev["driver"].tolist()
+    cols["team"] = ev["TeamName"].where(ev["TeamName"].notna() & ev["TeamName"].astype(bool), "").astype(str).tolist()
+    cols["grid_pos"] = ev["GridPosition"].astype("float64").tolist()
+    cols["quali_best_s"] = ev["driver"].map(q_best).astype("float64").tolist()
+    cols["race_pace_s"] = ev["race_pace_s"].astype("float64").tolist()
+    cols["race_laps_used"] = ev["race_laps_used"].fillna(0).astype(int).tolist()
+    cols["finish_pos"] = ev["Position"].astype("float64").tolist()
+    cols["error"] = [None] * n
+
+    return cols
+
+
+def _process_event(season: int, round_no: int, event_name: str, params: BuildParams) -> Tuple[Dict[str, List[Any]], Optional[EventFrames]]:
+    """
+    Load one race weekend (quali + race) and return its driver rows as columns,
+    plus the loaded frames (None when loading failed) for the season sidecar.
+    """
+    try:
+        frames = _load_event(season, round_no)
+    except _DataNotLoaded as e:
+        cols = _new_columns()
+        _append_row(cols, season=season, round=round_no, event=event_name, error=f"data_not_loaded: {e}")
+        return cols, None
+    except Exception as e:
+        cols = _new_columns()
+        _append_row(cols, season=season, round=round_no, event=event_name, error=f"load_failed: {e}")
+        return cols, None
+
+    return _event_rows(season, round_no, event_name, frames, params), frames
+
+
+def _add_labels(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Win/podium labels from finish_pos, pole/front-row labels from grid_pos.
+    Unknown (or 0 = pit lane start) positions give NaN labels.
+    """
+    for pos_col, win_col, top3_col in (
+        ("finish_pos", "label_win", "label_top3"),
+        ("grid_pos", "label_pole", "label_quali_top3"),
+    ):
+        pos = pd.to_numeric(df[pos_col], errors="coerce")
+        known = pos.notna() & pos.ne(0)
+        df[win_col] = np.where(known, pos.eq(1), np.nan)
+        df[top3_col] = np.where(known, pos.le(3), np.nan)
+    return df
 
 
-def build_table(params: BuildParams) -> pd.DataFrame:
-    rows: List[Dict[str, Any]] = []
+def build_table(params: BuildParams, max_workers: int = 8) -> pd.DataFrame:
+    cols = _new_columns()
+    tasks: List[Tuple[int, int, str]] = []
+    results: Dict[Tuple[int, int], Dict[str, List[Any]]] = {}
+    order: List[Tuple[int, int]] = []
 
     for season in params.seasons:
         try:
             schedule = fastf1.get_event_schedule(season)
         except Exception as e:
-            rows.append({
-                "season": season,
-                "round": None,
-                "event": None,
-                "driver": None,
-                "error": f"schedule_failed: {e}",
-            })
+            _append_row(cols, season=season, error=f"schedule_failed: {e}")
             continue
         # Use only official rounds (skip testing / round 0)
         schedule = schedule[schedule["RoundNumber"].fillna(0).astype(int) > 0]
 
-        for _, ev in schedule.iterrows():
-            round_no = int(ev["RoundNumber"])
-            event_name = str(ev["EventName"])
-
-            try:
-                event = fastf1.get_event(season, round_no)
-                q = event.get_qualifying()
-                r = event.get_race()
-
-                q.load(messages=False, weather=False)
-                r.load(messages=False, weather=False)
-
-                # Guard: sometimes FastF1 fails to load a session (0 drivers / no laps)
-                # In that case, skip this event instead of crashing the whole build.
-                if not getattr(q, '_laps', None) is not None and getattr(q, 'laps', None) is None:
-                    raise RuntimeError('qualifying_laps_not_loaded')
-                if not getattr(r, '_laps', None) is not None and getattr(r, 'laps', None) is None:
-                    raise RuntimeError('race_laps_not_loaded')
-
-            except Exception as e:
-                rows.append({
-                    "season": season,
-                    "round": round_no,
-                    "event": event_name,
-                    "driver": None,
-                    "error": f"load_failed: {e}",
-                })
-                continue
-
-            # --- Qualifying features ---
-            try:
-                qlaps = q.laps
-                rlaps = r.laps
-            except Exception as e:
-                rows.append({
-                    'season': season,
-                    'round': round_no,
-                    'event': event_name,
-                    'driver': None,
-                    'error': f'data_not_loaded: {e}',
-                })
-                continue
-
-            # best lap time per driver
-            q_best = (
-                qlaps.dropna(subset=["Driver", "LapTime"])
-                .groupby("Driver")["LapTime"]
-                .min()
-                .apply(_to_seconds)
-                .dropna()
-            )
-            # Grid position for race (from race result / laps data)
-            # FastF1: race.session_results has GridPosition and Position
-            try:
-                res = r.results  # DataFrame
-            except Exception:
-                res = None
-
-            # --- Race labels + race training-only features ---
-
-            drivers = sorted(list(set(rlaps["Driver"].dropna().unique().tolist())))
-
-            # finishing positions
-            pos_map: Dict[str, int] = {}
-            constructor_map: Dict[str, str] = {}
-            grid_map: Dict[str, Optional[int]] = {}
-
-            if res is not None and len(res) > 0:
-                for _, rr in res.iterrows():
-                    drv = rr.get("Abbreviation")
-                    if not drv:
-                        continue
-                    try:
-                        pos_map[str(drv)] = int(rr.get("Position"))
-                    except Exception:
-                        pass
-                    constructor_map[str(drv)] = str(rr.get("TeamName") or "")
-                    try:
-                        grid_map[str(drv)] = int(rr.get("GridPosition"))
-                    except Exception:
-                        grid_map[str(drv)] = None
-
-            for drv in drivers:
-                rdrv = rlaps.pick_driver(drv)
-                race_pace_s, laps_used = _robust_race_pace_seconds(
-                    rdrv,
-                    params.quick_quantile,
-                    params.outlier_seconds,
-                    params.min_race_laps,
-                )
-
-                finish_pos = pos_map.get(drv)
-                grid_pos = grid_map.get(drv)
-
-                rows.append({
-                    "season": season,
-                    "round": round_no,
-                    "event": event_name,
-                    "driver": drv,
-                    "team": constructor_map.get(drv, ""),
-                    # features
-                    "grid_pos": grid_pos,
-                    "quali_best_s": float(q_best.get(drv)) if drv in q_best.index else None,
-                    # training-only (do NOT use for pre-race inference)
-                    "race_pace_s": race_pace_s,
-                    "race_laps_used": laps_used,
-                    # labels
-                    "finish_pos": finish_pos,
-                    "label_win": 1 if finish_pos == 1 else 0 if finish_pos else None,
-                    "label_top3": 1 if finish_pos and finish_pos <= 3 else 0 if finish_pos else None,
-                    # pole labels from grid
-                    "label_pole": 1 if grid_pos == 1 else 0 if grid_pos else None,
-                    "label_quali_top3": 1 if grid_pos and grid_pos <= 3 else 0 if grid_pos else None,
-                    "error": None,
-                })
-
-    df = pd.DataFrame(rows)
-    return df
+        rounds = schedule["RoundNumber"].astype(int).tolist()
+        names = schedule["EventName"].astype(str).tolist()
+
+        # events already in the season sidecar don't touch FastF1 again
+        cached = _read_sidecar(season)
+        for round_no, event_name in zip(rounds, names):
+            order.append((season, round_no))
+            if round_no in cached:
+                results[season, round_no] = _event_rows(season, round_no, event_name, cached[round_no], params)
+            else:
+                tasks.append((season, round_no, event_name))
+
+    # session loads are I/O bound and independent; threads share one process,
+    # so _load_event's cache and the fastf1 cache set up above serve every task
+    loaded: Dict[int, Dict[int, EventFrames]] = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futures = {ex.submit(_process_event, *t, params): t for t in tasks}
+        for f in as_completed(futures):
+            season, round_no, _ = futures[f]
+            results[season, round_no], frames = f.result()
+            if frames is not None:
+                loaded.setdefault(season, {})[round_no] = frames
+
+    for season, frames in loaded.items():
+        _write_sidecar(season, {**_read_sidecar(season), **frames})
+
+    # keep schedule order regardless of completion order
+    for key in order:
+        for k, v in results[key].items():
+            cols[k].extend(v)
+
+    df = _add_labels(pd.DataFrame(cols))
+    return df[[*TABLE_COLUMNS[:-1], *LABEL_COLUMNS, "error"]]
 
 
 def main():
@@ -200,7 +316,12 @@ def main():
 
     out = "data/ml/driver_event_table_v1.parquet"
     os.makedirs(os.path.dirname(out), exist_ok=True)
-    df.to_parquet(out, index=False)
+    # sorted so the row-group min/max stats can prune later filtered reads
+    df = df.sort_values(["season", "round", "driver"], kind="stable")
+    df.to_parquet(
+        out, index=False, engine="pyarrow", compression="zstd", row_group_size=50_000,
+        data_page_size=1 << 20, use_dictionary=True, write_statistics=True,
+    )
 
     print(f"✅ Saved: {out}")
     print(df.head(10).to_string(index=False))
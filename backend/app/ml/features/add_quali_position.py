@@ -2,37 +2,53 @@ from __future__ import annotations
 
 from pathlib import Path
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 IN_PATH = Path("data/ml/driver_event_table_v1_3_features.parquet")
 OUT_PATH = Path("data/ml/driver_event_table_v1_4_quali_pos.parquet")
 
 
+def _write(table: pa.Table) -> None:
+    # rows arrive sorted by (season, round, driver), so row-group stats prune well
+    pq.write_table(
+        table, OUT_PATH, compression="zstd", row_group_size=50_000,
+        data_page_size=1 << 20, use_dictionary=True, write_statistics=True,
+    )
+
+
 def main():
-    df = pd.read_parquet(IN_PATH)
+    names = pq.read_schema(IN_PATH).names
 
     # If quali_pos already exists, just re-save
-    if "quali_pos" in df.columns:
-        df.to_parquet(OUT_PATH, index=False)
+    if "quali_pos" in names:
+        _write(pq.read_table(IN_PATH))
         print(f"✅ Saved (already had quali_pos): {OUT_PATH}")
         return
 
     # Build quali position from quali_best_s (lower is faster)
-    if "quali_best_s" not in df.columns:
+    if "quali_best_s" not in names:
         raise ValueError("quali_best_s not found. Cannot compute quali_pos.")
 
-    df = df.copy()
+    # every column is carried to the output, but only these go through pandas
+    table = pq.read_table(IN_PATH)
+    df = table.select(["season", "round", "quali_best_s"]).to_pandas()
     df["quali_best_s"] = pd.to_numeric(df["quali_best_s"], errors="coerce")
 
     # Rank within each event (season, round)
-    df["quali_pos"] = (
+    quali_pos = (
         df.groupby(["season", "round"])["quali_best_s"]
           .rank(method="min", ascending=True)
     )
 
     # Some drivers might not have quali time; keep as NaN
-    df.to_parquet(OUT_PATH, index=False)
+    table = table.set_column(
+        names.index("quali_best_s"), "quali_best_s", pa.array(df["quali_best_s"].to_numpy(), type=pa.float64())
+    )
+    table = table.append_column("quali_pos", pa.array(quali_pos.to_numpy(), type=pa.float64(), from_pandas=True))
+    _write(table)
     print(f"✅ Saved: {OUT_PATH}")
-    print("Columns:", list(df.columns))
+    print("Columns:", table.column_names)
 
 
 if __name__ == "__main__":
@@ -3,80 +3,87 @@ from __future__ import annotations
 import pandas as pd
 import numpy as np
 
+from app.ml._kernels import shift_rolling_mean
 
-def _safe_points(pos: float) -> float:
+# Approx FIA points (top 10), indexed by finish position. Not perfect but good baseline.
+_PTS = np.zeros(64, dtype=np.float32)
+_PTS[1:11] = [25, 18, 15, 12, 10, 8, 6, 4, 2, 1]
+
+
+def race_points(finish_pos) -> np.ndarray:
     """
-    Approx FIA points (top 10). Not perfect but good baseline.
+    Points per row via one table gather; missing/unclassified positions score 0.
     """
-    if pd.isna(pos):
-        return 0.0
-    pos = int(pos)
-    pts = {1:25,2:18,3:15,4:12,5:10,6:8,7:6,8:4,9:2,10:1}
-    return float(pts.get(pos, 0))
+    pos = pd.to_numeric(pd.Series(finish_pos), errors="coerce").to_numpy(dtype=np.float64)
+    idx = np.clip(np.where(np.isnan(pos), 0, pos), 0, _PTS.size - 1).astype(np.int64)
+    return _PTS[idx]
 
 
-def add_features(df: pd.DataFrame, window: int = 5) -> pd.DataFrame:
-    df = df.copy()
+def _grouped_shift_rolling_mean(keys: np.ndarray, vals: np.ndarray, window: int) -> np.ndarray:
+    """
+    Same as groupby(keys)[cols].apply(lambda s: s.shift(1).rolling(window, min_periods=1).mean())
+    for an (N, K) matrix whose rows are sorted so that each key is contiguous.
+    Missing keys (code -1) give NaN rows.
+    """
+    keys = np.asarray(keys)
+    vals = np.ascontiguousarray(vals, dtype=np.float64)
+    if keys.size == 0:
+        return vals.copy()
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1], True])
+    out = shift_rolling_mean(starts.astype(np.int64), vals, window)
+    out[keys < 0] = np.nan
+    return out
 
-    # Data cleaning: ensure season/round/driver exist
-    df['season'] = pd.to_numeric(df.get('season'), errors='coerce')
-    df['round'] = pd.to_numeric(df.get('round'), errors='coerce')
-    df = df.dropna(subset=['season','round','driver'])
-    df['season'] = df['season'].astype(int)
-    df['round'] = df['round'].astype(int)
 
-    # sort timeline
-    df["race_index"] = df["season"].astype(int) * 100 + df["round"].astype(int)
-    df = df.sort_values(["driver", "race_index"])
+def add_features(df: pd.DataFrame, window: int = 5) -> pd.DataFrame:
+    # Data cleaning: ensure season/round/driver exist (take() gives the one copy we need)
+    season = pd.to_numeric(df.get('season'), errors='coerce')
+    rnd = pd.to_numeric(df.get('round'), errors='coerce')
+    keep = (season.notna() & rnd.notna() & df['driver'].notna()).to_numpy()
+    df = df.take(np.flatnonzero(keep))
+    df["season"] = season[keep].to_numpy().astype(np.int32)
+    df["round"] = rnd[keep].to_numpy().astype(np.int32)
+
+    # timeline
+    race_index = (df["season"].to_numpy() * 100 + df["round"].to_numpy()).astype(np.int32)
+    df["race_index"] = race_index
 
     # base points
-    df["points"] = df["finish_pos"].apply(_safe_points)
-
-    # driver rolling form
-    df["drv_roll_points"] = (
-        df.groupby("driver")["points"]
-          .apply(lambda s: s.shift(1).rolling(window, min_periods=1).mean())
-          .reset_index(level=0, drop=True)
-    )
-    df["drv_roll_finish"] = (
-        df.groupby("driver")["finish_pos"]
-          .apply(lambda s: s.shift(1).rolling(window, min_periods=1).mean())
-          .reset_index(level=0, drop=True)
-    )
-    df["drv_roll_grid"] = (
-        df.groupby("driver")["grid_pos"]
-          .apply(lambda s: s.shift(1).rolling(window, min_periods=1).mean())
-          .reset_index(level=0, drop=True)
-    )
-    df["drv_roll_quali"] = (
-        df.groupby("driver")["quali_best_s"]
-          .apply(lambda s: s.shift(1).rolling(window, min_periods=1).mean())
-          .reset_index(level=0, drop=True)
-    )
+    df["points"] = race_points(df["finish_pos"])
+
+    # the kernel wants each group contiguous and in race order; gather through an
+    # argsort and scatter back instead of re-sorting the whole frame per key
+    def roll(codes: np.ndarray, order: np.ndarray, m: np.ndarray) -> np.ndarray:
+        out = np.empty_like(m)
+        out[order] = _grouped_shift_rolling_mean(codes[order], m[order], window)
+        return out
+
+    num = lambda c: pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float64)
+    points, finish, grid, quali = num("points"), num("finish_pos"), num("grid_pos"), num("quali_best_s")
+
+    # driver rolling form: all five columns in one kernel pass
+    drv_codes = pd.factorize(df["driver"], sort=True)[0]
+    drv_order = np.lexsort((race_index, drv_codes))
+    pos_delta = finish - grid
+    drv_roll = roll(drv_codes, drv_order, np.column_stack([points, finish, grid, quali, pos_delta]))
+    df["drv_roll_points"] = drv_roll[:, 0]
+    df["drv_roll_finish"] = drv_roll[:, 1]
+    df["drv_roll_grid"] = drv_roll[:, 2]
+    df["drv_roll_quali"] = drv_roll[:, 3]
 
     # racecraft = finish - grid (negative = gained positions)
     df["pos_delta"] = df["finish_pos"] - df["grid_pos"]
-    df["drv_roll_pos_delta"] = (
-        df.groupby("driver")["pos_delta"]
-          .apply(lambda s: s.shift(1).rolling(window, min_periods=1).mean())
-          .reset_index(level=0, drop=True)
-    )
+    df["drv_roll_pos_delta"] = drv_roll[:, 4]
 
-    # team rolling form
-    df = df.sort_values(["team", "race_index"])
-    df["team_roll_points"] = (
-        df.groupby("team")["points"]
-          .apply(lambda s: s.shift(1).rolling(window, min_periods=1).mean())
-          .reset_index(level=0, drop=True)
-    )
-    df["team_roll_finish"] = (
-        df.groupby("team")["finish_pos"]
-          .apply(lambda s: s.shift(1).rolling(window, min_periods=1).mean())
-          .reset_index(level=0, drop=True)
-    )
+    # team rolling form (teammates in the same race stay in driver order)
+    team_codes = pd.factorize(df["team"], sort=True)[0]
+    team_order = np.lexsort((drv_codes, race_index, team_codes))
+    team_roll = roll(team_codes, team_order, np.column_stack([points, finish]))
+    df["team_roll_points"] = team_roll[:, 0]
+    df["team_roll_finish"] = team_roll[:, 1]
 
-    # reset ordering
-    df = df.sort_values(["season", "round", "driver"])
+    # single final ordering
+    df = df.sort_values(["season", "round", "driver"], kind="stable")
     return df
 
 
@@ -87,7 +94,11 @@ def main():
     out = add_features(df, window=5)
 
     out_path = "data/ml/driver_event_table_v1_3_features.parquet"
-    out.to_parquet(out_path, index=False)
+    # add_features returns rows sorted by (season, round, driver)
+    out.to_parquet(
+        out_path, index=False, engine="pyarrow", compression="zstd", row_group_size=50_000,
+        data_page_size=1 << 20, use_dictionary=True, write_statistics=True,
+    )
 
     print(f"✅ Saved: {out_path}")
     cols = ["season","round","driver","team","grid_pos","finish_pos","drv_roll_points","team_roll_points","drv_roll_quali","drv_roll_pos_delta"]
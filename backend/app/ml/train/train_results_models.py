@@ -7,10 +7,13 @@ from typing import List, Dict, Any, Tuple
 
 import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 
+from joblib import Parallel, delayed
+from sklearn.base import clone
 from sklearn.model_selection import GroupKFold
 from sklearn.metrics import roc_auc_score, log_loss
-from sklearn.preprocessing import OneHotEncoder
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.impute import SimpleImputer
@@ -89,26 +92,61 @@ def _pick_features(df: pd.DataFrame, kind: str) -> Tuple[List[str], List[str]]:
     return numeric, cat
 
 
-def _build_model(numeric_cols: List[str], cat_cols: List[str]) -> Pipeline:
+def _build_model(numeric_cols: List[Any], cat_cols: List[Any]) -> Pipeline:
+    # columns are names for DataFrames, positions for the CV matrix
     pre = ColumnTransformer(
         transformers=[
             ("num", Pipeline(steps=[
                 ("imputer", SimpleImputer(strategy="median")),
+                # saga converges slowly on unscaled inputs (season ~2000, lap times ~90s)
+                ("scaler", StandardScaler()),
             ]), numeric_cols),
             ("cat", Pipeline(steps=[
                 ("imputer", SimpleImputer(strategy="most_frequent")),
-                ("ohe", OneHotEncoder(handle_unknown="ignore")),
+                ("ohe", OneHotEncoder(handle_unknown="ignore", sparse_output=True, dtype=np.float32)),
             ]), cat_cols),
         ],
         remainder="drop",
     )
 
-    # Strong baseline; stable and fast
-    clf = LogisticRegression(max_iter=2000, n_jobs=1)
+    # Strong baseline; saga works on the sparse one-hot matrix directly
+    clf = LogisticRegression(solver="saga", max_iter=2000, tol=1e-3)
 
     return Pipeline(steps=[("pre", pre), ("clf", clf)])
 
 
+def _fold_matrix(X: pd.DataFrame, numeric_cols: List[str], cat_cols: List[str]) -> np.ndarray:
+    """
+    Numeric columns followed by category codes (NaN = missing) as one float matrix,
+    so folds are plain row gathers instead of DataFrame slices.
+    """
+    num = X[numeric_cols].to_numpy(dtype=np.float64)
+    codes = [X[c].cat.codes.to_numpy().astype(np.float64) for c in cat_cols]
+    cat = np.column_stack(codes) if codes else np.empty((len(X), 0))
+    cat[cat < 0] = np.nan
+    return np.hstack([num, cat])
+
+
+def _fit_fold(model: Pipeline, M: np.ndarray, y: np.ndarray, tr: np.ndarray, te: np.ndarray):
+    """
+    Fit a fresh copy of model on one fold; returns (te, oof_proba, auc, logloss).
+    """
+    m = clone(model)
+    m.fit(M[tr], y[tr])
+    p = m.predict_proba(M[te])[:, 1]
+
+    # metrics
+    try:
+        auc = roc_auc_score(y[te], p)
+    except Exception:
+        auc = None
+    try:
+        ll = log_loss(y[te], p, labels=[0, 1])
+    except Exception:
+        ll = None
+    return te, p, auc, ll
+
+
 def _train_cv(df: pd.DataFrame, target: str, kind: str) -> Dict[str, Any]:
     """
     GroupKFold by race (season-round) to avoid leakage across drivers in same race.
@@ -117,36 +155,40 @@ def _train_cv(df: pd.DataFrame, target: str, kind: str) -> Dict[str, Any]:
     d = df.dropna(subset=[target]).copy()
     d[target] = d[target].astype(int)
 
-    # define groups by event
-    d["group"] = d["season"].astype(int) * 100 + d["round"].astype(int)
-
     numeric_cols, cat_cols = _pick_features(d, kind)
+    # small fixed vocabularies; category codes are cheaper to impute/encode than strings
+    for c in cat_cols:
+        d[c] = d[c].astype("category")
     model = _build_model(numeric_cols, cat_cols)
 
     X = d[numeric_cols + cat_cols]
     y = d[target].values
-    groups = d["group"].values
+    # GroupKFold by event
+    groups = d["race_index"].to_numpy()
 
     gkf = GroupKFold(n_splits=min(5, len(np.unique(groups))))
     oof = np.zeros(len(d), dtype=float)
 
+    # CV runs the same pipeline on the encoded matrix (columns by position); the
+    # preprocessing is still fit per training fold, so there's no leakage
+    M = _fold_matrix(X, numeric_cols, cat_cols)
+    n_num = len(numeric_cols)
+    cv_model = _build_model(list(range(n_num)), list(range(n_num, M.shape[1])))
+
+    # folds are independent; fit them concurrently
+    folds = Parallel(n_jobs=-1)(
+        delayed(_fit_fold)(cv_model, M, y, tr, te) for tr, te in gkf.split(M, y, groups)
+    )
+
     aucs = []
     lls = []
 
-    for tr, te in gkf.split(X, y, groups):
-        model.fit(X.iloc[tr], y[tr])
-        p = model.predict_proba(X.iloc[te])[:, 1]
+    for te, p, auc, ll in folds:
         oof[te] = p
-
-        # metrics
-        try:
-            aucs.append(roc_auc_score(y[te], p))
-        except Exception:
-            pass
-        try:
-            lls.append(log_loss(y[te], p, labels=[0, 1]))
-        except Exception:
-            pass
+        if auc is not None:
+            aucs.append(auc)
+        if ll is not None:
+            lls.append(ll)
 
     # fit final model on all
     model.fit(X, y)
@@ -165,14 +207,33 @@ def _train_cv(df: pd.DataFrame, target: str, kind: str) -> Dict[str, Any]:
     return {"model": model, "report": report}
 
 
+def _needed_columns(path: str) -> List[str]:
+    """
+    Columns used by any model (features + keys + label sources) that exist in the file.
+    """
+    names = pq.read_schema(path).names
+    empty = pd.DataFrame(columns=names)
+    wanted = ["season", "round", "driver", "finish_pos", "quali_pos"]
+    for kind in ("quali", "race"):
+        numeric, cat = _pick_features(empty, kind)
+        wanted += numeric + cat
+    return [c for c in dict.fromkeys(wanted) if c in names]
+
+
 def main():
-    df = pd.read_parquet(DATA_PATH)
+    df = pd.read_parquet(DATA_PATH, columns=_needed_columns(DATA_PATH), engine="pyarrow")
     df = df.dropna(subset=["season", "round", "driver"])
-    df["season"] = df["season"].astype(int)
-    df["round"] = df["round"].astype(int)
+    df[["season", "round"]] = df[["season", "round"]].astype(np.int32)
+    df["race_index"] = (df["season"].to_numpy() * 100 + df["round"].to_numpy()).astype(np.int32)
 
     df = _ensure_targets(df)
 
+    # small value ranges: narrower dtypes halve the bytes every fold scans
+    df["season"] = df["season"].astype(np.int16)
+    df["round"] = df["round"].astype(np.int8)
+    float_cols = [c for c in df.columns if df[c].dtype.kind in "fi" and c not in ("season", "round", "race_index")]
+    df[float_cols] = df[float_cols].astype(np.float32)
+
     outputs = {}
 
     # Qualifying models (if quali_pos exists)
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from typing import List
+
+from pydantic import BaseModel
+
+
+class SeasonList(BaseModel):
+    seasons: List[int]
+
+
+class RaceInfo(BaseModel):
+    round: int
+    raceName: str
+    date: str | None = None
+
+
+class RaceList(BaseModel):
+    season: int
+    races: List[RaceInfo]
+
+
+class SessionList(BaseModel):
+    season: int
+    round: int
+    sessions: List[str]
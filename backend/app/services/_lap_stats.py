@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from app.ml._kernels import grouped_line_fit
+
+# NaT is stored as the smallest int64, so presence is one integer compare on the raw buffer
+_NAT = np.iinfo(np.int64).min
+
+
+def _present(laps: pd.DataFrame, col: str) -> np.ndarray:
+    if col not in laps.columns:
+        return np.zeros(len(laps), dtype=bool)
+    s = laps[col]
+    if pd.api.types.is_timedelta64_dtype(s) or pd.api.types.is_datetime64_dtype(s):
+        return s.to_numpy().view("i8") != _NAT
+    # e.g. an all-NaN float column filled in for a missing field
+    return s.notna().to_numpy()
+
+
+def pit_mask(laps: pd.DataFrame) -> np.ndarray:
+    """
+    In/out laps: PitInTime or PitOutTime set on the lap.
+    """
+    return _present(laps, "PitInTime") | _present(laps, "PitOutTime")
+
+
+def lap_seconds(s: pd.Series) -> pd.Series:
+    """
+    Lap times as float seconds in one vectorized pass (NaT -> NaN).
+    """
+    if not pd.api.types.is_timedelta64_dtype(s):
+        s = pd.to_timedelta(s, errors="coerce")
+    return s.dt.total_seconds()
+
+
+def nullable(s: pd.Series) -> pd.Series:
+    """
+    Object series with None for missing values, ready for to_dict / JSON.
+    """
+    return s.astype(object).where(s.notna(), None)
+
+
+def quick_laps_by(df: pd.DataFrame, keys: List[str], q: float) -> pd.DataFrame:
+    """
+    Per-group quick-lap filter: keep laps at or under each group's lap_s quantile.
+    """
+    if df.empty:
+        return df
+    thresh = df.groupby(keys, dropna=False, sort=False)["lap_s"].transform("quantile", q)
+    return df[df["lap_s"] <= thresh]
+
+
+def grouped_linear_fit(df: pd.DataFrame, keys: List[str], x: str = "LapNumber", y: str = "lap_s") -> pd.DataFrame:
+    """
+    Least squares y = slope*x + intercept for every group in one compiled pass.
+    Returns a frame indexed by `keys` with n, slope, intercept, r2.
+    Groups with no spread in x get slope 0 and intercept mean(y),
+    like the old per-stint polyfit guard.
+    """
+    gb = df.groupby(keys, dropna=False, sort=False)
+    sizes = gb.size()
+    # lay every group out as one contiguous run for the kernel
+    order = np.argsort(gb.ngroup().to_numpy(), kind="stable")
+    starts = np.zeros(len(sizes) + 1, dtype=np.int64)
+    np.cumsum(sizes.to_numpy(), out=starts[1:])
+    # float32 is plenty for lap numbers and ms-resolution lap times and halves the bytes read
+    slope, intercept, r2 = grouped_line_fit(
+        starts,
+        np.ascontiguousarray(df[x].to_numpy(dtype=np.float32)[order]),
+        np.ascontiguousarray(df[y].to_numpy(dtype=np.float32)[order]),
+    )
+    return pd.DataFrame(
+        {"n": sizes.to_numpy(), "slope": slope, "intercept": intercept, "r2": r2},
+        index=sizes.index,
+    )
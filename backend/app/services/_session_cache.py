@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import threading
+from functools import lru_cache
+from typing import Dict, Tuple
+
+import fastf1
+
+from app.core.fastf1_cache import init_fastf1_cache
+
+# Parsed sessions kept in-process; strategy, tyres, degradation and weather for
+# one race weekend usually hit the same few sessions back to back
+SESSION_CACHE_SIZE = 64
+
+_LOCKS: Dict[Tuple, threading.Lock] = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+@lru_cache(maxsize=SESSION_CACHE_SIZE)
+def _load_session(season: int, round_no: int, code: str):
+    init_fastf1_cache()
+    session = fastf1.get_session(season, round_no, code)
+    # one flavour for every analysis service: laps + weather, no telemetry/messages
+    session.load(laps=True, weather=True, telemetry=False, messages=False)
+    return session
+
+
+def get_loaded_session(season: int, round_no: int, code: str):
+    """
+    Return a loaded fastf1 session, parsing it at most once per process.
+    Callers must treat session.laps / session.weather_data as read-only (copy before mutating).
+    Concurrent first requests for the same session wait for one load instead of each parsing it.
+    The key is (season, round, code) only: every caller gets the same laps+weather load, so
+    load flags are deliberately not part of it and one session never has several entries.
+    """
+    key = (int(season), int(round_no), str(code))
+    with _LOCKS_GUARD:
+        lock = _LOCKS.setdefault(key, threading.Lock())
+    with lock:
+        return _load_session(*key)
+
+
+def clear_session_cache() -> None:
+    _load_session.cache_clear()
@@ -1,10 +1,70 @@
 from __future__ import annotations
 
-from typing import Dict, Any
+import os
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 import fastf1
 
-fastf1.Cache.enable_cache("cache")
+from app.core.fastf1_cache import init_fastf1_cache
+from app.ml.features.add_rolling_form import race_points
+
+HISTORY_PATH = "data/ml/driver_event_table_v1_4_quali_pos.parquet"
+HISTORY_COLS = ["season", "round", "driver", "team", "finish_pos", "grid_pos", "quali_best_s"]
+ROLL_COLS = [
+    "drv_roll_points", "drv_roll_finish", "drv_roll_grid", "drv_roll_quali", "drv_roll_pos_delta",
+    "team_roll_points", "team_roll_finish",
+]
+
+
+@lru_cache(maxsize=1)
+def _read_history(mtime_ns: int) -> pd.DataFrame:
+    """
+    Read the history parquet once per file version (keyed on its mtime), sorted by
+    race_index with points/pos_delta precomputed, so each event's "before this
+    race" slice is a searchsorted prefix instead of a fresh parquet scan.
+    """
+    hist = pq.read_table(HISTORY_PATH, columns=HISTORY_COLS).to_pandas()
+    hist["race_index"] = hist["season"].to_numpy() * 100 + hist["round"].to_numpy()
+    hist = hist.sort_values("race_index", kind="stable", ignore_index=True)
+    hist["points"] = race_points(hist["finish_pos"])
+    hist["pos_delta"] = hist["finish_pos"] - hist["grid_pos"]
+    return hist
+
+
+def _history_table() -> Optional[pd.DataFrame]:
+    # stat'd outside the cache so a parquet built or rebuilt after the first call is picked up
+    try:
+        mtime_ns = os.stat(HISTORY_PATH).st_mtime_ns
+    except OSError:
+        return None
+    return _read_history(mtime_ns)
+
+
+def _rolling_form(season: int, round_no: int, window: int = 5) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """
+    Rolling driver/team form going into (season, round_no): the mean of each
+    driver's / team's last `window` result rows before the event, i.e. what
+    add_features' shift(1).rolling(window) gives the event's rows.
+    Returns (drv_roll_* indexed by driver, team_roll_* indexed by team).
+    """
+    table = _history_table()
+    if table is None:
+        return None
+
+    cut = np.searchsorted(table["race_index"].to_numpy(), season * 100 + round_no, side="left")
+    hist = table.iloc[:cut]
+
+    drv = (
+        hist.groupby("driver").tail(window)
+        .groupby("driver")[["points", "finish_pos", "grid_pos", "quali_best_s", "pos_delta"]].mean()
+    )
+    drv.columns = ["drv_roll_points", "drv_roll_finish", "drv_roll_grid", "drv_roll_quali", "drv_roll_pos_delta"]
+    team = hist.groupby("team").tail(window).groupby("team")[["points", "finish_pos"]].mean()
+    team.columns = ["team_roll_points", "team_roll_finish"]
+    return drv, team
 
 
 def build_features_for_event(season: int, round_no: int) -> pd.DataFrame:
@@ -17,6 +77,8 @@ def build_features_for_event(season: int, round_no: int) -> pd.DataFrame:
     - round
     NOTE: v1 uses minimal set so it matches your trained model expectations.
     """
+    init_fastf1_cache()
+
     # Qualifying
     q = fastf1.get_session(season, round_no, "Q")
     q.load()
@@ -27,11 +89,11 @@ def build_features_for_event(season: int, round_no: int) -> pd.DataFrame:
 
     # Build quali best lap per driver
     qlaps = q.laps
+    q_min = qlaps.groupby("Driver")["LapTime"].min()
     qbest = (
-        qlaps.groupby("Driver")["LapTime"]
-        .min()
-        .dropna()
+        pd.to_timedelta(q_min, errors="coerce")
         .dt.total_seconds()
+        .dropna()
         .rename("quali_best_s")
         .reset_index()
     )
@@ -62,13 +124,17 @@ def build_features_for_event(season: int, round_no: int) -> pd.DataFrame:
     base["season"] = int(season)
     base["round"] = int(round_no)
 
-    # Minimal placeholders for rolling/team form (v1)
-    # Later we will compute these from historical parquet.
-    for c in [
-        "drv_roll_points","drv_roll_finish","drv_roll_grid","drv_roll_quali","drv_roll_pos_delta",
-        "team_roll_points","team_roll_finish",
-        "incident","sc","vsc","red_flag"
-    ]:
+    # Rolling/team form from the historical parquet (placeholders if it isn't built yet)
+    form = _rolling_form(season, round_no)
+    if form is not None:
+        drv_form, team_form = form
+        base = base.join(drv_form, on="driver").join(team_form, on="team")
+    else:
+        for c in ROLL_COLS:
+            base[c] = 0.0
+
+    # Minimal placeholders for incident proxies (v1)
+    for c in ["incident", "sc", "vsc", "red_flag"]:
         base[c] = 0.0
 
     return base
@@ -8,31 +8,55 @@ Auto-detected source:
   from app.services.predict_results import predict_race
 """
 from __future__ import annotations
-from typing import Any, Dict
+import inspect
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
 
 from app.services.predict_results import predict_race as _predict_race_impl
+from app.services.predict_results import predict_race_arrays
 
 
-def predict_race_live(season: int, round_no: int, topk: int = 20) -> Dict[str, Any]:
+def _make_call() -> Callable[[int, int, int], Dict[str, Any]]:
     """
-    Returns a dict shaped like the /predict/race endpoint output (at least containing 'all').
-    We call the underlying predictor with best-effort signature matching.
+    Pick the call shape once from the predictor's signature instead of probing
+    with TypeError on every call (named args first, then positional fallbacks).
     """
-    # Try common call signatures (named args first, then positional fallbacks)
     try:
-        return _predict_race_impl(season=season, round_no=round_no, topk=topk)
-    except TypeError:
-        pass
+        params = inspect.signature(_predict_race_impl).parameters
+    except (TypeError, ValueError):
+        return lambda season, round_no, topk: _predict_race_impl(season, round_no)
 
-    try:
-        return _predict_race_impl(season=season, round_no=round_no)
-    except TypeError:
-        pass
+    if any(p.kind is inspect.Parameter.VAR_KEYWORD for p in params.values()):
+        return lambda season, round_no, topk: _predict_race_impl(season=season, round_no=round_no, topk=topk)
+    if "season" in params and "round_no" in params:
+        if "topk" in params:
+            return lambda season, round_no, topk: _predict_race_impl(season=season, round_no=round_no, topk=topk)
+        return lambda season, round_no, topk: _predict_race_impl(season=season, round_no=round_no)
+
+    positional = [
+        p for p in params.values()
+        if p.kind in (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)
+    ]
+    if len(positional) >= 3 or any(p.kind is inspect.Parameter.VAR_POSITIONAL for p in params.values()):
+        return lambda season, round_no, topk: _predict_race_impl(season, round_no, topk)
+    return lambda season, round_no, topk: _predict_race_impl(season, round_no)
+
+
+_CALL = _make_call()
 
-    try:
-        return _predict_race_impl(season, round_no, topk)
-    except TypeError:
-        pass
 
-    # Final fallback
-    return _predict_race_impl(season, round_no)
+def predict_race_live(season: int, round_no: int, topk: int = 20) -> Dict[str, Any]:
+    """
+    Returns a dict shaped like the /predict/race endpoint output (at least containing 'all').
+    We call the underlying predictor with the signature matched at import.
+    """
+    return _CALL(season, round_no, topk)
+
+
+def predict_race_live_arrays(season: int, round_no: int, topk: int = 20) -> Tuple[List[str], List[Any], np.ndarray]:
+    """
+    (drivers, teams, p_win) in predicted order, i.e. the 'all' rows as arrays,
+    for callers that only need the numbers (the championship simulator).
+    """
+    return predict_race_arrays(season, round_no, topk=topk)
@@ -1,21 +1,21 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from datetime import date
 from functools import lru_cache
-from typing import Dict, Any
-import math
+from typing import Dict, Any, List, Tuple
 
+import numpy as np
 import pandas as pd
 import fastf1
 
+from app.core.disk_cache import cache_path, dump_pickle, is_miss, load_pickle, season_max_age
+from app.core.fastf1_cache import init_fastf1_cache
+from app.ml._kernels import inverse_position_scores, softmax
+from app.services import schedule
 
-def _softmax(scores: Dict[str, float]) -> Dict[str, float]:
-    if not scores:
-        return {}
-    m = max(scores.values())
-    exps = {k: math.exp(v - m) for k, v in scores.items()}
-    s = sum(exps.values()) or 1.0
-    return {k: exps[k] / s for k in exps}
+SESSION_LOAD_WORKERS = 8
 
 
 def _safe_str(x: Any) -> str:
@@ -25,6 +25,20 @@ def _safe_str(x: Any) -> str:
         return ""
 
 
+def _abbr_array(res: pd.DataFrame):
+    """Upper-cased driver abbreviations of a results frame; missing ones become ""."""
+    return res["Abbreviation"].fillna("").astype(str).str.upper().to_numpy()
+
+
+def _team_array(res: pd.DataFrame) -> np.ndarray:
+    """TeamName (or Team) as an object array of str, with missing/blank entries as None."""
+    col = res["TeamName"] if "TeamName" in res.columns else res.get("Team")
+    if col is None:
+        return np.full(len(res), None, dtype=object)
+    s = col.astype(str)
+    return s.where(col.notna() & (s != ""), None).to_numpy(dtype=object)
+
+
 def _is_data_not_available_error(e: Exception) -> bool:
     msg = _safe_str(e).lower()
     needles = [
@@ -45,336 +59,308 @@ class DriverStrength:
     team: str | None = None
 
 
-@lru_cache(maxsize=16)
-def _build_strength_from_season(season_ref: int) -> Dict[str, DriverStrength]:
-    schedule = fastf1.get_event_schedule(season_ref)
+def _load_results(season: int, rnd: int, kind: str) -> pd.DataFrame | None:
+    """Load only the classification of one session; None if it is unavailable."""
+    init_fastf1_cache()
+    try:
+        ses = fastf1.get_session(season, rnd, kind)
+        ses.load(laps=False, telemetry=False, weather=False, messages=False)
+        res = getattr(ses, "results", None)
+        return res if res is not None and len(res) > 0 else None
+    except Exception:
+        return None
 
-    race_points: Dict[str, float] = {}
-    quali_pos_sum: Dict[str, float] = {}
-    quali_pos_n: Dict[str, int] = {}
-    team_map: Dict[str, str] = {}
 
-    for _, row in schedule.iterrows():
-        rnd = row.get("RoundNumber", None)
-        if rnd is None:
-            continue
-        try:
-            rnd = int(rnd)
-        except Exception:
-            continue
-        if rnd <= 0:
+@lru_cache(maxsize=16)
+def _build_strength_from_season(season_ref: int) -> Dict[str, DriverStrength]:
+    path = cache_path("strength", season_ref)
+    cached = load_pickle(path, season_max_age(season_ref))
+    if not is_miss(cached):
+        return cached
+
+    rounds = schedule.valid_rounds(season_ref).tolist()
+    # raise rather than return {}: lru_cache would keep an empty table after one offline moment
+    if not rounds:
+        raise RuntimeError(f"no data: no schedule rounds available for {season_ref}")
+
+    # Session loads are IO-bound: overlap them, then reduce everything in schedule order.
+    tasks = [(rnd, kind) for rnd in rounds for kind in ("R", "Q")]
+    with ThreadPoolExecutor(max_workers=SESSION_LOAD_WORKERS) as ex:
+        loaded = list(ex.map(lambda t: _load_results(season_ref, t[0], t[1]), tasks))
+
+    frames = []
+    for (_rnd, kind), res in zip(tasks, loaded):
+        if res is None:
             continue
-
-        # Race
-        try:
-            s_r = fastf1.get_session(season_ref, rnd, "R")
-            s_r.load()
-            res = getattr(s_r, "results", None)
-            if res is not None and len(res) > 0:
-                for _, rr in res.iterrows():
-                    drv = _safe_str(rr.get("Abbreviation", "")).upper()
-                    if not drv:
-                        continue
-                    pts = rr.get("Points", 0.0)
-                    try:
-                        pts = float(pts) if pts is not None else 0.0
-                    except Exception:
-                        pts = 0.0
-                    race_points[drv] = race_points.get(drv, 0.0) + pts
-
-                    team = rr.get("TeamName", None)
-                    if team and drv not in team_map:
-                        team_map[drv] = _safe_str(team)
-        except Exception:
-            pass
-
-        # Quali
         try:
-            s_q = fastf1.get_session(season_ref, rnd, "Q")
-            s_q.load()
-            qres = getattr(s_q, "results", None)
-            if qres is not None and len(qres) > 0:
-                for _, qq in qres.iterrows():
-                    drv = _safe_str(qq.get("Abbreviation", "")).upper()
-                    if not drv:
-                        continue
-                    pos = qq.get("Position", None)
-                    try:
-                        pos = float(pos)
-                    except Exception:
-                        continue
-                    quali_pos_sum[drv] = quali_pos_sum.get(drv, 0.0) + pos
-                    quali_pos_n[drv] = quali_pos_n.get(drv, 0) + 1
-
-                    team = qq.get("TeamName", None)
-                    if team and drv not in team_map:
-                        team_map[drv] = _safe_str(team)
+            col = "Points" if kind == "R" else "Position"
+            f = pd.DataFrame({
+                "drv": _abbr_array(res),
+                "val": pd.to_numeric(res[col], errors="coerce").to_numpy(dtype=float),
+                "team": _team_array(res),
+            })
+            f["is_race"] = kind == "R"
+            f = f[f["drv"] != ""]
+            if kind == "R":
+                f["val"] = f["val"].fillna(0.0)
+            else:
+                f = f[f["val"].notna()]
+            frames.append(f)
         except Exception:
             pass
 
-    out: Dict[str, DriverStrength] = {}
-    for drv, pts in race_points.items():
-        out[drv] = DriverStrength(score=float(pts), team=team_map.get(drv))
+    if not frames:
+        raise RuntimeError(f"no data: no race or qualifying results could be loaded for {season_ref}")
+    allres = pd.concat(frames, ignore_index=True)
+    # first non-empty team seen for the driver, races and qualis interleaved by round
+    first_team = allres.groupby("drv", sort=False)["team"].first()
+    team_of = first_team.astype(object).where(first_team.notna(), None).to_dict()
+
+    race = allres[allres["is_race"]]
+    if len(race):
+        pts = race.groupby("drv", sort=False)["val"].sum()
+        out = {drv: DriverStrength(score=float(p), team=team_of[drv]) for drv, p in pts.items()}
+    else:
+        avg_pos = allres.groupby("drv", sort=False)["val"].mean()
+        out = {drv: DriverStrength(score=float(1.0 / max(a, 1.0)), team=team_of[drv]) for drv, a in avg_pos.items()}
 
     if not out:
-        for drv, s in quali_pos_sum.items():
-            n = quali_pos_n.get(drv, 0)
-            if n <= 0:
-                continue
-            avg_pos = s / n
-            out[drv] = DriverStrength(score=float(1.0 / max(avg_pos, 1.0)), team=team_map.get(drv))
-
+        raise RuntimeError(f"no data: no classified drivers in the {season_ref} results")
+    dump_pickle(path, out)
     return out
 
 
+def warm_prediction_caches(season: int | None = None) -> None:
+    """
+    Pre-fill what the first predict requests would otherwise fetch: the previous
+    season's strength table (fallback model) and the R/Q classifications of the
+    given (default: current) season in the FastF1 disk cache. Best-effort.
+    """
+    season = season or date.today().year
+    try:
+        _build_strength_from_season(max(season - 1, 2018))
+    except Exception:
+        pass  # not cached; the first fallback request retries
+    tasks = [(rnd, kind) for rnd in schedule.valid_rounds(season).tolist() for kind in ("R", "Q")]
+    with ThreadPoolExecutor(max_workers=SESSION_LOAD_WORKERS) as ex:
+        list(ex.map(lambda t: _load_results(season, t[0], t[1]), tasks))
+
+
+def _strength_ranking(strength: Dict[str, DriverStrength], k: int) -> Tuple[List[str], List[str | None], np.ndarray]:
+    """Top-k (drivers, teams, probs) of the strength table, best first."""
+    names = [drv for drv, ds in strength.items() if ds.score is not None]
+    if not names:
+        return [], [], np.empty(0)
+    arr = np.fromiter((strength[d].score for d in names), dtype=np.float64, count=len(names))
+
+    # softmax is monotone, so rank on the raw scores and only exponentiate the
+    # top-k numerators; the denominator is one log-sum-exp style reduction
+    top = np.argsort(-arr, kind="stable")[:k]
+    m = arr.max()
+    p = np.exp(arr[top] - m) / np.exp(arr - m).sum()
+    drvs = [names[i] for i in top.tolist()]
+    return drvs, [strength[d].team for d in drvs], p
+
+
+def _fallback_ranking(season_ref: int, k: int) -> Tuple[List[str], List[str | None], np.ndarray]:
+    """Strength-table ranking, or empty arrays if that season's results can't be loaded."""
+    try:
+        strength = _build_strength_from_season(season_ref)
+    except Exception:
+        return [], [], np.empty(0)
+    return _strength_ranking(strength, k)
+
+
 def _fallback_predict(season: int, round_no: int, kind: str, topk: int = 3) -> Dict[str, Any]:
     season_ref = max(season - 1, 2018)
-    strength = _build_strength_from_season(season_ref)
+    drvs, teams, p = _fallback_ranking(season_ref, max(topk, 3))
+    if not drvs:
+        return {"season": season, "round": round_no, "source": f"historical_baseline_{season_ref}",
+                "message": f"No baseline available: no {season_ref} results could be loaded."}
+
+    pack = _race_payload if kind == "race" else _quali_payload
+    out = pack(season, round_no, f"historical_baseline_{season_ref}", drvs, teams, p)
+    out["note"] = "Future session data not available; using historical baseline strength model."
+    return out
 
-    scores = {drv: ds.score for drv, ds in strength.items() if ds.score is not None}
-    probs = _softmax(scores)
-    ranked = sorted(probs.items(), key=lambda kv: kv[1], reverse=True)[: max(topk, 3)]
 
-    if kind == "race":
-        winner_drv, pwin = ranked[0]
-        return {
-            "season": season,
-            "round": round_no,
-            "source": f"historical_baseline_{season_ref}",
-            "winner": {
-                "driver": winner_drv,
-                "team": strength.get(winner_drv).team if winner_drv in strength else None,
-                "p_win": float(pwin),
-                "p_top3": float(sum(p for _, p in ranked[:3])),
+def _race_payload(season: int, round_no: int, source: str, drvs, teams, p: np.ndarray) -> Dict[str, Any]:
+    """Response body for ranked (drivers, teams, p_win) arrays, best first."""
+    p = p.tolist()
+    return {
+        "season": season,
+        "round": round_no,
+        "source": source,
+        "winner": {
+            "driver": drvs[0],
+            "team": teams[0],
+            "p_win": p[0],
+            "p_top3": sum(p[:3]),
+            "grid_pos": None,
+            "quali_best_s": None,
+        },
+        "top3": [
+            {
+                "driver": drvs[i],
+                "team": teams[i],
+                "p_win": p[i] if i == 0 else 0.0,
+                "p_top3": p[i],
                 "grid_pos": None,
                 "quali_best_s": None,
-            },
-            "top3": [
-                {
-                    "driver": drv,
-                    "team": strength.get(drv).team if drv in strength else None,
-                    "p_win": float(p) if i == 0 else 0.0,
-                    "p_top3": float(p),
-                    "grid_pos": None,
-                    "quali_best_s": None,
-                }
-                for i, (drv, p) in enumerate(ranked[:3])
-            ],
-            "note": "Future session data not available; using historical baseline strength model.",
-        }
+            }
+            for i in range(min(3, len(p)))
+        ],
+        "all": [{"driver": d, "team": t, "p_win": q} for d, t, q in zip(drvs, teams, p)],
+    }
+
 
-    pole_drv, ppole = ranked[0]
+def _quali_payload(season: int, round_no: int, source: str, drvs, teams, p: np.ndarray) -> Dict[str, Any]:
+    p = p.tolist()
     return {
         "season": season,
         "round": round_no,
-        "source": f"historical_baseline_{season_ref}",
+        "source": source,
         "pole": {
-            "driver": pole_drv,
-            "team": strength.get(pole_drv).team if pole_drv in strength else None,
-            "p_pole": float(ppole),
-            "p_top3": float(sum(p for _, p in ranked[:3])),
+            "driver": drvs[0],
+            "team": teams[0],
+            "p_pole": p[0],
+            "p_top3": sum(p[:3]),
             "quali_best_s": None,
         },
         "top3": [
             {
-                "driver": drv,
-                "team": strength.get(drv).team if drv in strength else None,
-                "p_pole": float(p) if i == 0 else 0.0,
-                "p_top3": float(p),
+                "driver": drvs[i],
+                "team": teams[i],
+                "p_pole": p[i] if i == 0 else 0.0,
+                "p_top3": p[i],
                 "quali_best_s": None,
             }
-            for i, (drv, p) in enumerate(ranked[:3])
+            for i in range(min(3, len(p)))
         ],
-        "note": "Future session data not available; using historical baseline strength model.",
+        "all": [{"driver": d, "team": t, "p_pole": q} for d, t, q in zip(drvs, teams, p)],
     }
 
 
-def predict_race(season: int, round_no: int, topk: int = 3) -> Dict[str, Any]:
-    try:
-        sess = fastf1.get_session(season, round_no, "R")
-        sess.load()
-        results = getattr(sess, "results", None)
-        if results is None or len(results) == 0:
-            return _baseline_quali(season, round_no, topk=topk)
-
-        scores: Dict[str, float] = {}
-        team_map: Dict[str, str] = {}
-
-        for _, r in results.iterrows():
-            drv = _safe_str(r.get("Abbreviation", "")).upper()
-            if not drv:
-                continue
-            pos = r.get("Position", None)
-            try:
-                pos = float(pos)
-            except Exception:
-                continue
-            scores[drv] = 1.0 / max(pos, 1.0)
-
-            team = r.get("TeamName", None)
-            if team and drv not in team_map:
-                team_map[drv] = _safe_str(team)
-
-        probs = _softmax(scores)
-        ranked = sorted(probs.items(), key=lambda kv: kv[1], reverse=True)
-        top = ranked[: max(topk, 3)]
-        winner_drv, pwin = top[0]
+def _rank_by_position(results: pd.DataFrame) -> Tuple[List[str], List[str | None], np.ndarray]:
+    """
+    Score each classified driver as 1/position, softmax the scores in one numpy
+    pass and return (drivers, teams, probs) ordered by descending probability.
+    """
+    drvs = _abbr_array(results)
+    pos = pd.to_numeric(results["Position"], errors="coerce").to_numpy(dtype=float)
+    teams = _team_array(results)
+
+    keep = (drvs != "") & ~np.isnan(pos)
+    drvs, pos, teams = drvs[keep], pos[keep], teams[keep]
+    if len(drvs) == 0:
+        raise ValueError("no data: results have no classified drivers")
+
+    p = softmax(inverse_position_scores(np.ascontiguousarray(pos)))
+    order = np.argsort(-p, kind="stable")
+    return drvs[order].tolist(), teams[order].tolist(), p[order]
 
-        return {
-            "season": season,
-            "round": round_no,
-            "source": "live_fastf1",
-            "winner": {
-                "driver": winner_drv,
-                "team": team_map.get(winner_drv),
-                "p_win": float(pwin),
-                "p_top3": float(sum(p for _, p in top[:3])),
-                "grid_pos": None,
-                "quali_best_s": None,
-            },
-            "top3": [
-                {
-                    "driver": drv,
-                    "team": team_map.get(drv),
-                    "p_win": float(p) if i == 0 else 0.0,
-                    "p_top3": float(p),
-                    "grid_pos": None,
-                    "quali_best_s": None,
-                }
-                for i, (drv, p) in enumerate(top[:3])
-            ],
-        }
 
+def predict_race_arrays(season: int, round_no: int, topk: int = 20) -> Tuple[List[str], List[str | None], np.ndarray]:
+    """
+    (drivers, teams, p_win) in predicted order - the same ranking predict_race
+    reports as "all", without building the response body. Used by the
+    championship simulator.
+    """
+    try:
+        results = _session_results(season, round_no, "R")
+        if results is None:
+            rows = _baseline_race(season, round_no, topk=topk).get("all", [])
+            return (
+                [r["driver"] for r in rows],
+                [r["team"] for r in rows],
+                np.array([r["p_win"] for r in rows], dtype=float),
+            )
+        drvs, teams, probs = _rank_by_position(results)
+        k = max(topk, 3)
+        return drvs[:k], teams[:k], probs[:k]
     except Exception as e:
         if _is_data_not_available_error(e):
-            return _fallback_predict(season, round_no, "race", topk=topk)
+            return _fallback_ranking(max(season - 1, 2018), max(topk, 3))
         raise
 
 
-def predict_quali(season: int, round_no: int, topk: int = 3) -> Dict[str, Any]:
+def _session_results(season: int, round_no: int, code: str) -> pd.DataFrame | None:
+    init_fastf1_cache()
+    sess = fastf1.get_session(season, round_no, code)
+    sess.load()
+    results = getattr(sess, "results", None)
+    return results if results is not None and len(results) > 0 else None
+
+
+def _predict_live(season: int, round_no: int, kind: str, topk: int) -> Dict[str, Any]:
+    """
+    Shared body of predict_race / predict_quali (kind "race" / "quali"): rank the
+    session's classification, else the same-event history baseline if it has no
+    results yet, else the previous season's strength table if FastF1 has no data.
+    """
+    code = "R" if kind == "race" else "Q"
     try:
-        sess = fastf1.get_session(season, round_no, "Q")
-        sess.load()
-        results = getattr(sess, "results", None)
-        if results is None or len(results) == 0:
-            return _baseline_quali(season, round_no, topk=topk)
-
-        scores: Dict[str, float] = {}
-        team_map: Dict[str, str] = {}
-
-        for _, r in results.iterrows():
-            drv = _safe_str(r.get("Abbreviation", "")).upper()
-            if not drv:
-                continue
-            pos = r.get("Position", None)
-            try:
-                pos = float(pos)
-            except Exception:
-                continue
-            scores[drv] = 1.0 / max(pos, 1.0)
-
-            team = r.get("TeamName", None)
-            if team and drv not in team_map:
-                team_map[drv] = _safe_str(team)
-
-        probs = _softmax(scores)
-        ranked = sorted(probs.items(), key=lambda kv: kv[1], reverse=True)
-        top = ranked[: max(topk, 3)]
-        pole_drv, ppole = top[0]
+        results = _session_results(season, round_no, code)
+        if results is None:
+            return _baseline_from_history(season, round_no, kind=code, topk=topk)
 
-        return {
-            "season": season,
-            "round": round_no,
-            "source": "live_fastf1",
-            "pole": {
-                "driver": pole_drv,
-                "team": team_map.get(pole_drv),
-                "p_pole": float(ppole),
-                "p_top3": float(sum(p for _, p in top[:3])),
-                "quali_best_s": None,
-            },
-            "top3": [
-                {
-                    "driver": drv,
-                    "team": team_map.get(drv),
-                    "p_pole": float(p) if i == 0 else 0.0,
-                    "p_top3": float(p),
-                    "quali_best_s": None,
-                }
-                for i, (drv, p) in enumerate(top[:3])
-            ],
-        }
+        drvs, teams, probs = _rank_by_position(results)
+        k = max(topk, 3)
+        pack = _race_payload if kind == "race" else _quali_payload
+        return pack(season, round_no, "live_fastf1", drvs[:k], teams[:k], probs[:k])
 
     except Exception as e:
         if _is_data_not_available_error(e):
-            return _fallback_predict(season, round_no, "quali", topk=topk)
+            return _fallback_predict(season, round_no, kind, topk=topk)
         raise
 
-# --- BASELINE_FALLBACK_START ---
-from typing import Optional, Dict, Any, List, Tuple
-import fastf1
 
-def _get_event_name(season: int, round_no: int) -> Optional[str]:
-    try:
-        sch = fastf1.get_event_schedule(season)
-    except Exception:
-        return None
-    for _, row in sch.iterrows():
-        rnd = row.get("RoundNumber", row.get("Round", None))
-        try:
-            if rnd is not None and int(rnd) == int(round_no):
-                name = row.get("EventName", row.get("Event", None))
-                return str(name) if name else None
-        except Exception:
-            continue
-    return None
+def predict_race(season: int, round_no: int, topk: int = 3) -> Dict[str, Any]:
+    return _predict_live(season, round_no, "race", topk)
 
-def _find_round_by_event_name(season: int, event_name: str) -> Optional[int]:
-    try:
-        sch = fastf1.get_event_schedule(season)
-    except Exception:
-        return None
-    target = (event_name or "").strip().lower()
-    for _, row in sch.iterrows():
-        name = row.get("EventName", row.get("Event", None))
-        if not name:
-            continue
-        if str(name).strip().lower() == target:
-            rnd = row.get("RoundNumber", row.get("Round", None))
-            try:
-                return int(rnd)
-            except Exception:
-                return None
-    return None
+
+def predict_quali(season: int, round_no: int, topk: int = 3) -> Dict[str, Any]:
+    return _predict_live(season, round_no, "quali", topk)
+
+# --- BASELINE_FALLBACK_START ---
+# In-process tier over the disk cache; only non-empty results are kept so
+# transient load failures are retried on the next request.
+_HIST_CACHE: Dict[Tuple[str, str, int], List[Dict[str, Any]]] = {}
 
 def _hist_results(event_name: str, kind: str, year: int):
-    rnd = _find_round_by_event_name(year, event_name)
+    key = (event_name, kind, year)
+    if key in _HIST_CACHE:
+        return _HIST_CACHE[key]
+    path = cache_path("hist_results", year, kind, event_name)
+    rows = load_pickle(path, season_max_age(year))
+    if is_miss(rows):
+        rows = _hist_results_uncached(event_name, kind, year)
+        if rows:
+            dump_pickle(path, rows)
+    if rows and season_max_age(year) is None:
+        _HIST_CACHE[key] = rows
+    return rows
+
+def _hist_results_uncached(event_name: str, kind: str, year: int):
+    rnd = schedule.round_by_event_name(year, event_name)
     if rnd is None:
         return None
-    try:
-        ses = fastf1.get_session(year, rnd, kind)  # kind: "R" or "Q"
-        ses.load(messages=False, weather=False)
-        res = ses.results
-        if res is None or len(res) == 0:
-            return None
-        rows = []
-        for _, r in res.iterrows():
-            abbr = r.get("Abbreviation")
-            team = r.get("TeamName") or r.get("Team")
-            pos = r.get("Position")
-            if not abbr or pos is None:
-                continue
-            try:
-                pos = int(pos)
-            except Exception:
-                continue
-            rows.append({"abbr": str(abbr), "team": str(team) if team else "", "pos": pos})
-        return rows if rows else None
-    except Exception:
+    res = _load_results(year, rnd, kind)  # kind: "R" or "Q"
+    if res is None:
+        return None
+    abbr = res["Abbreviation"]
+    pos = pd.to_numeric(res["Position"], errors="coerce")
+    keep = (abbr.notna() & abbr.astype(bool) & pos.notna()).to_numpy()
+    if not keep.any():
         return None
+    teams = _team_array(res)[keep]
+    return [
+        {"abbr": a, "team": t or "", "pos": p}
+        for a, t, p in zip(abbr[keep].astype(str).tolist(), teams.tolist(), pos[keep].astype(int).tolist())
+    ]
 
 def _baseline_from_history(season: int, round_no: int, kind: str, topk: int = 3) -> Dict[str, Any]:
-    event_name = _get_event_name(season, round_no) or ""
+    event_name = schedule.event_name(season, round_no) or ""
     if not event_name:
         return {"season": season, "round": round_no, "source": "baseline_history",
                 "message": "No schedule/event name available yet for this season/round."}
@@ -384,8 +370,13 @@ def _baseline_from_history(season: int, round_no: int, kind: str, topk: int = 3)
     top3 = {}
     team_of = {}
 
-    for y in range(season - 1, max(season - 6, 2018), -1):
-        rows = _hist_results(event_name, kind, y)
+    # Fetch every look-back year at once (at most 5, all needed), then consume
+    # newest-first so the result matches the sequential walk.
+    years = list(range(season - 1, max(season - 6, 2018), -1))
+    with ThreadPoolExecutor(max_workers=max(len(years), 1)) as ex:
+        history = list(ex.map(lambda y: _hist_results(event_name, kind, y), years))
+
+    for rows in history:
         if not rows:
             continue
         used += 1
@@ -430,6 +421,7 @@ def _baseline_from_history(season: int, round_no: int, kind: str, topk: int = 3)
             "season": season, "round": round_no, "source": "baseline_history", "event": event_name,
             "winner": pack(*ranked[0]),
             "top3": [pack(*x) for x in ranked[:3]],
+            "all": [{"driver": d, "team": team_of.get(d, ""), "p_win": float(pw)} for (d, pw, _pt) in ranked],
             "meta": {"years_used": used, "mode": "baseline"}
         }
 
@@ -440,6 +432,7 @@ def _baseline_from_history(season: int, round_no: int, kind: str, topk: int = 3)
         "pole": {"driver": pole_d, "team": team_of.get(pole_d, ""), "p_pole": float(pole_p), "p_top3": float(pole_t3), "quali_best_s": None},
         "top3": [{"driver": d, "team": team_of.get(d, ""), "p_pole": float(pw), "p_top3": float(pt), "quali_best_s": None}
                  for (d,pw,pt) in ranked[:3]],
+        "all": [{"driver": d, "team": team_of.get(d, ""), "p_pole": float(pw)} for (d, pw, _pt) in ranked],
         "meta": {"years_used": used, "mode": "baseline"}
     }
 
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import fastf1
+
+from app.core.disk_cache import cache_path, dump_pickle, is_miss, load_pickle, season_max_age
+from app.core.fastf1_cache import init_fastf1_cache
+
+
+def _sched_col(sch: pd.DataFrame, name: str, alt: str) -> pd.Series:
+    if name in sch.columns:
+        return sch[name]
+    if alt in sch.columns:
+        return sch[alt]
+    return pd.Series([None] * len(sch), index=sch.index, dtype=object)
+
+
+@lru_cache(maxsize=16)
+def _season_events(season: int) -> Tuple[Dict[int, str], Dict[str, int]]:
+    # raises instead of returning {} so a failed schedule load isn't memoised
+    path = cache_path("event_names", season)
+    names = load_pickle(path, season_max_age(season))
+    if is_miss(names):
+        init_fastf1_cache()
+        sch = fastf1.get_event_schedule(season)
+        rnd = pd.to_numeric(_sched_col(sch, "RoundNumber", "Round"), errors="coerce")
+        name = _sched_col(sch, "EventName", "Event")
+        mask = rnd.ge(1) & name.notna() & ~name.astype(str).str.contains("Testing", case=False, na=False)
+        if "EventFormat" in sch.columns:
+            mask &= sch["EventFormat"].astype(str).str.lower() != "testing"
+        names = dict(zip(rnd[mask].astype(int).tolist(), name[mask].astype(str).tolist()))
+        if not names:
+            raise ValueError(f"no championship rounds in the {season} schedule")
+        dump_pickle(path, names)
+    return names, {n.strip().lower(): r for r, n in names.items()}
+
+
+def event_names(season: int) -> Dict[int, str]:
+    """
+    {round: event name} for the season's championship rounds (round >= 1, no
+    testing), built in one vectorized pass over the schedule and cached per
+    season. Empty if the schedule can't be loaded.
+    """
+    try:
+        return _season_events(season)[0]
+    except Exception:
+        return {}
+
+
+def event_name(season: int, round_no: int) -> Optional[str]:
+    return event_names(season).get(int(round_no))
+
+
+def round_by_event_name(season: int, name: str) -> Optional[int]:
+    try:
+        return _season_events(season)[1].get((name or "").strip().lower())
+    except Exception:
+        return None
+
+
+def valid_rounds(season: int, top_round: int | None = None) -> np.ndarray:
+    """Championship round numbers (int32, ascending), optionally capped at top_round."""
+    rounds = np.fromiter(sorted(event_names(season)), dtype=np.int32)
+    if top_round is not None:
+        rounds = rounds[rounds <= int(top_round)]
+    return rounds
@@ -1,16 +1,22 @@
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 import random
 import numpy as np
 
 # Optional dependency (only required for full mode)
 try:
-    from app.services.predict_live import predict_race_live
+    from app.services.predict_live import predict_race_live_arrays
 except ModuleNotFoundError:
-    predict_race_live = None
+    predict_race_live_arrays = None
 
-import fastf1
 from collections import defaultdict
 
+from app.services.schedule import valid_rounds
+
+
+# F1 points (modern)
+POINTS_TOP10 = [25, 18, 15, 12, 10, 8, 6, 4, 2, 1]
+POINTS_TOP10_NP = np.array(POINTS_TOP10, dtype=np.int32)
+
 
 def simulate_season(
     season: int,
@@ -34,7 +40,7 @@ def simulate_season(
     else:
         sims = min(int(sims), 100)
 
-    if mode == "full" and predict_race_live is None:
+    if mode == "full" and predict_race_live_arrays is None:
         raise RuntimeError("Full mode requires app.services.predict_live")
 
     return _simulate_season_impl(
@@ -52,55 +58,27 @@ def _simulate_season_impl(
     mode: str = "fast",
 ) -> Dict[str, Any]:
 
-    schedule = fastf1.get_event_schedule(season)
-
-    # Filter race events only
-    races = schedule[schedule["EventFormat"] != "testing"]
-
-    if upto_round is not None:
-        races = races[races["RoundNumber"] <= upto_round]
-
-    rounds = int(races["RoundNumber"].max())
+    # Championship rounds only (no testing), as an int32 array
+    races = valid_rounds(season, upto_round)
+    if len(races) == 0:
+        raise RuntimeError(f"No championship rounds found for {season}")
 
-    driver_titles = defaultdict(int)
-    constructor_titles = defaultdict(int)
+    rounds = int(races.max())
 
     if mode == "fast":
         return _simulate_fast_expected_points(season, races, upto_round)
 
     # -------- FULL MONTE CARLO MODE --------
-    for _ in range(n_sims):
-        driver_points = defaultdict(float)
-        team_points = defaultdict(float)
-
-        for _, row in races.iterrows():
-            rnd = int(row["RoundNumber"])
-
-            preds = predict_race_live(season, rnd)
-
-            for i, d in enumerate(preds["all"]):
-                pts = _points_for_position(i + 1)
-                driver_points[d["driver"]] += pts
-                team_points[d["team"]] += pts
-
-        champ_driver = max(driver_points, key=driver_points.get)
-        champ_team = max(team_points, key=team_points.get)
-
-        driver_titles[champ_driver] += 1
-        constructor_titles[champ_team] += 1
+    # Predictions are deterministic per round, so fetch them once up front
+    # and run every simulation as one batched tensor draw.
+    drivers, driver_titles, teams, constructor_titles = _simulate_titles(_round_arrays(season, races), n_sims)
 
     return {
         "season": season,
         "mode": mode,
         "rounds_simulated": rounds,
-        "driver_champion": [
-            {"driver": k, "prob": v / n_sims}
-            for k, v in sorted(driver_titles.items(), key=lambda x: -x[1])
-        ],
-        "constructor_champion": [
-            {"team": k, "prob": v / n_sims}
-            for k, v in sorted(constructor_titles.items(), key=lambda x: -x[1])
-        ],
+        "driver_champion": _title_odds("driver", drivers, driver_titles, n_sims),
+        "constructor_champion": _title_odds("team", teams, constructor_titles, n_sims),
         "n_sims": n_sims,
     }
 
@@ -109,19 +87,13 @@ def _simulate_fast_expected_points(season, races, upto_round=None):
     """
     Fast approximation using expected race probabilities.
     """
-    from app.services.predict_live import predict_race_live
-
     driver_points = defaultdict(float)
     team_points = defaultdict(float)
 
-    for _, row in races.iterrows():
-        rnd = int(row["RoundNumber"])
-        preds = predict_race_live(season, rnd)
-
-        for i, d in enumerate(preds["all"]):
-            pts = _points_for_position(i + 1)
-            driver_points[d["driver"]] += pts * d["p_win"]
-            team_points[d["team"]] += pts * d["p_win"]
+    for drivers, teams, p_win, pts in _round_arrays(season, races):
+        for d, t, e in zip(drivers, teams, (pts * p_win).tolist()):
+            driver_points[d] += e
+            team_points[t] += e
 
     return {
         "season": season,
@@ -137,6 +109,96 @@ def _simulate_fast_expected_points(season, races, upto_round=None):
     }
 
 
-def _points_for_position(pos: int) -> int:
-    points = [25, 18, 15, 12, 10, 8, 6, 4, 2, 1]
-    return points[pos - 1] if pos <= len(points) else 0
+def _sample_finish_order(p_win: np.ndarray, size: Tuple[int, ...] = ()) -> np.ndarray:
+    """
+    Sample finishing orders without replacement, proportional to p_win.
+
+    Gumbel-top-k: adding Gumbel noise to log-weights and sorting draws the
+    whole order in one pass instead of n successive renormalised choices.
+    p_win may be a padded (rounds, slots) matrix; NaN slots always finish last.
+    `size` adds leading batch dimensions (e.g. (n_sims,)).
+    """
+    logw = np.where(np.isnan(p_win), -np.inf, np.log(np.clip(p_win, 1e-6, None)))
+    return np.argsort(-(logw + np.random.gumbel(size=size + logw.shape)), axis=-1)
+
+
+def _simulate_titles(per_round, n_sims: int, batch: int = 2000):
+    """
+    Monte Carlo championship over all rounds at once.
+
+    Rounds are padded into (rounds, slots) matrices of global driver/team ids,
+    p_win and position points; each batch of simulations samples every finishing
+    order in one argsort, scatter-adds the points of the top-10 finishers into
+    (sims, drivers) / (sims, teams) totals and counts the argmax per simulation.
+    """
+    drv_ids: Dict[str, int] = {}
+    team_ids: Dict[str, int] = {}
+    n_rounds = len(per_round)
+    n_slots = max((len(r[0]) for r in per_round), default=0)
+
+    drv = np.zeros((n_rounds, n_slots), dtype=np.int64)
+    team = np.zeros((n_rounds, n_slots), dtype=np.int64)
+    p_win = np.full((n_rounds, n_slots), np.nan)
+    pts = np.zeros((n_rounds, n_slots), dtype=np.int32)
+    for r, (drivers, teams, pw, pp) in enumerate(per_round):
+        n = len(drivers)
+        drv[r, :n] = [drv_ids.setdefault(d, len(drv_ids)) for d in drivers]
+        team[r, :n] = [team_ids.setdefault(t, len(team_ids)) for t in teams]
+        p_win[r, :n] = pw
+        pts[r, :n] = pp
+
+    driver_titles = np.zeros(len(drv_ids), dtype=np.int64)
+    constructor_titles = np.zeros(len(team_ids), dtype=np.int64)
+    if n_rounds == 0 or n_slots == 0:
+        return list(drv_ids), driver_titles, list(team_ids), constructor_titles
+
+    k = min(n_slots, len(POINTS_TOP10))
+    top_pts = pts[:, :k]
+    rows = np.arange(n_rounds)[:, None]
+    for start in range(0, n_sims, batch):
+        m = min(batch, n_sims - start)
+        top = _sample_finish_order(p_win, size=(m,))[..., :k]  # (m, rounds, k) slot ids
+        sims = np.broadcast_to(np.arange(m)[:, None, None], top.shape)
+        w = np.broadcast_to(top_pts, top.shape)
+
+        # one scatter-add per batch; padded / out-of-points slots carry 0
+        d_pts = np.zeros((m, len(drv_ids)), dtype=np.int32)
+        np.add.at(d_pts, (sims, drv[rows, top]), w)
+        t_pts = np.zeros((m, len(team_ids)), dtype=np.int32)
+        np.add.at(t_pts, (sims, team[rows, top]), w)
+
+        # Points are integers, so sub-point jitter only breaks ties, uniformly at random.
+        d_champ = (d_pts + np.random.random(d_pts.shape)).argmax(axis=1)
+        t_champ = (t_pts + np.random.random(t_pts.shape)).argmax(axis=1)
+        driver_titles += np.bincount(d_champ, minlength=len(drv_ids))
+        constructor_titles += np.bincount(t_champ, minlength=len(team_ids))
+
+    # ids were handed out in insertion order, so the dict keys are the id -> name table
+    return list(drv_ids), driver_titles, list(team_ids), constructor_titles
+
+
+def _title_odds(key: str, names, counts: np.ndarray, n_sims: int):
+    """Title probabilities, most likely first, skipping names that never won."""
+    order = np.argsort(-counts, kind="stable")
+    return [{key: names[i], "prob": int(counts[i]) / n_sims} for i in order if counts[i]]
+
+
+def _round_arrays(season, rounds):
+    """
+    Predict every round once and keep (drivers, teams, p_win, points) arrays
+    in predicted finishing order, so the simulation loops never re-predict.
+    """
+    out = []
+    for rnd in rounds.tolist():
+        drivers, teams, p_win = predict_race_live_arrays(season, rnd)
+        pts = _position_points(len(drivers))
+        out.append((np.array(drivers, dtype=object), np.array(teams, dtype=object), np.asarray(p_win, dtype=float), pts))
+    return out
+
+
+def _position_points(n: int) -> np.ndarray:
+    """Points for finishing positions 1..n (int32, zero outside the top 10)."""
+    pts = np.zeros(n, dtype=np.int32)
+    k = min(n, len(POINTS_TOP10_NP))
+    pts[:k] = POINTS_TOP10_NP[:k]
+    return pts
@@ -1,51 +1,105 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Tuple
 
 import numpy as np
 import pandas as pd
-import fastf1
 
-fastf1.Cache.enable_cache("cache")
+from app.services._lap_stats import grouped_linear_fit, lap_seconds, nullable, pit_mask, quick_laps_by
+from app.services._session_cache import get_loaded_session
 
 
-def _to_seconds(td) -> float:
-    if pd.isna(td):
-        return float("nan")
-    return pd.to_timedelta(td).total_seconds()
-
-
-def _quick_laps(df: pd.DataFrame, q: float = 0.75) -> pd.DataFrame:
+def _pit_laps(laps: pd.DataFrame) -> List[int]:
     """
-    Keep quicker laps (remove slow tail). Uses lap_s quantile per group.
+    Extract pit-in laps (where PitInTime exists).
     """
-    if df.empty:
-        return df
-    thresh = float(df["lap_s"].quantile(q))
-    return df[df["lap_s"] <= thresh].copy()
+    if laps.empty or "PitInTime" not in laps.columns:
+        return []
+    pl = laps.loc[laps["PitInTime"].notna(), "LapNumber"].dropna().to_numpy(dtype=np.int64)
+    # de-duplicated and sorted in one call
+    return np.unique(pl).tolist()
 
 
-def _stint_pace(laps: pd.DataFrame, q: float = 0.75) -> Optional[float]:
+def _stint_records(blocks: pd.DataFrame, degradation_threshold_sec_per_lap: float) -> Dict[Any, List[Dict[str, Any]]]:
     """
-    Robust pace estimate for a stint: median of quick laps.
+    Per-driver stint dicts (ordered by lap_start) built column-wise from the
+    aggregated (Driver, Stint, Compound) frame.
     """
-    if laps.empty:
-        return None
-    laps2 = _quick_laps(laps, q=q)
-    if laps2.empty:
-        return None
-    return float(laps2["lap_s"].median())
+    blocks = blocks.reset_index().sort_values(["Driver", "lap_start"], kind="stable")
+    lap_start = blocks["lap_start"].astype(int)
+    lap_end = blocks["lap_end"].astype(int)
+
+    # Degradation slope (sec/lap) quick-laps linear fit, only with enough (quick) non-pit laps
+    fitted = (blocks["non_pit"] >= 5) & (blocks["n"] >= 5)
+    slope = blocks["slope"].where(fitted)
+
+    # Suggested pit window for this stint if degradation is high
+    # simple: suggest middle-to-late part of stint
+    span = lap_end - lap_start
+    from_lap = np.maximum(lap_start, (lap_start + span * 0.55).astype(int)).tolist()
+    to_lap = np.maximum(lap_start, (lap_start + span * 0.85).astype(int)).tolist()
+    windows: List[Any] = [None] * len(blocks)
+    for i in np.flatnonzero((slope >= degradation_threshold_sec_per_lap).to_numpy()):
+        windows[i] = {
+            "from_lap": from_lap[i],
+            "to_lap": to_lap[i],
+            "reason": f"Degradation slope {slope.iat[i]:.3f} sec/lap exceeds threshold {degradation_threshold_sec_per_lap:.3f}",
+        }
+
+    # Whole-number stints (fastf1 stores them as floats) become ints, other labels stay strings
+    raw = blocks["Stint"]
+    num = pd.to_numeric(raw, errors="coerce")
+    stint_no = (
+        num.round().astype("Int64").astype(object)
+        .where(num % 1 == 0, raw.astype(str))
+        .where(raw.notna(), None)
+    )
+
+    stints = pd.DataFrame(
+        {
+            "stint": stint_no,
+            "compound": blocks["Compound"].astype(str),
+            "lap_start": lap_start,
+            "lap_end": lap_end,
+            "pace_median_quick_s": nullable(blocks["pace"]),
+            "deg_slope_sec_per_lap": nullable(slope),
+            "deg_r2": nullable(blocks["r2"].where(fitted)),
+            "suggested_pit_window": windows,
+        },
+        index=blocks.index,
+    )
 
+    out: Dict[Any, List[Dict[str, Any]]] = {}
+    for d, rec in zip(blocks["Driver"].tolist(), stints.to_dict("records")):
+        out.setdefault(d, []).append(rec)
+    return out
 
-def _pit_laps(laps: pd.DataFrame) -> List[int]:
+
+PIT_EFFECT_WINDOW_LAPS = 3
+
+
+def _pit_window_paces(laps: pd.DataFrame, window: int = PIT_EFFECT_WINDOW_LAPS) -> Dict[Tuple[Any, int, str], float]:
     """
-    Extract pit-in laps (where PitInTime exists).
+    Median non-pit lap_s in the `window` laps before ("pre") and after ("post")
+    every pit-in lap, for all drivers at once: one merge of (driver, lap) probes
+    against the clean laps instead of two masked scans per pit stop.
     """
     if laps.empty or "PitInTime" not in laps.columns:
-        return []
-    pl = laps[~laps["PitInTime"].isna()]["LapNumber"].dropna().astype(int).tolist()
-    # de-duplicate and sort
-    return sorted(list(dict.fromkeys(pl)))
+        return {}
+    pits = laps.loc[laps["PitInTime"].notna(), ["Driver", "LapNumber"]].dropna()
+    pits = pd.DataFrame({"Driver": pits["Driver"], "pit_lap": pits["LapNumber"].astype(int)}).drop_duplicates()
+    if pits.empty:
+        return {}
+
+    offsets = np.r_[-window:0, 1:window + 1]
+    probes = pits.merge(pd.DataFrame({"offset": offsets}), how="cross")
+    probes["LapNumber"] = (probes["pit_lap"] + probes["offset"]).astype(float)
+    probes["side"] = np.where(probes["offset"] < 0, "pre", "post")
+
+    clean = laps.loc[~laps["is_pit"], ["Driver", "LapNumber", "lap_s"]]
+    hits = probes.merge(clean, on=["Driver", "LapNumber"])
+    med = hits.groupby(["Driver", "pit_lap", "side"])["lap_s"].median()
+    return {k: float(v) for k, v in med.items()}
 
 
 def compute_strategy_intelligence(
@@ -53,6 +107,7 @@ def compute_strategy_intelligence(
     round_no: int,
     degradation_threshold_sec_per_lap: float = 0.06,
     quick_quantile: float = 0.75,
+    session=None,
 ) -> Dict[str, Any]:
     """
     Strategy Intelligence v1:
@@ -60,97 +115,56 @@ def compute_strategy_intelligence(
     - global: suggested pit window when degradation exceeds threshold (driver-specific)
     - undercut/overcut heuristic: compare pre/post pit pace around pit events
     """
-    session = fastf1.get_session(season, round_no, "R")
-    session.load(weather=False, telemetry=False, messages=False)
+    if session is None:
+        session = get_loaded_session(season, round_no, "R")
 
-    laps_all = session.laps.copy()
+    laps_all = session.laps
     if laps_all.empty:
         return {"season": season, "round": round_no, "message": "No laps available", "drivers": []}
 
+    # Work on the columns used below only; the session (and its laps) is shared via the session cache
+    cols = [c for c in ["Driver", "LapNumber", "LapTime", "Stint", "Compound", "PitInTime", "PitOutTime"] if c in laps_all.columns]
     # Precompute lap seconds
-    laps_all["lap_s"] = laps_all["LapTime"].apply(_to_seconds)
+    laps_all = laps_all[cols].assign(lap_s=lap_seconds(laps_all["LapTime"]))
     laps_all = laps_all.dropna(subset=["LapNumber", "lap_s", "Driver"])
 
     # Identify pit marker
-    laps_all["is_pit"] = (~laps_all.get("PitInTime").isna()) | (~laps_all.get("PitOutTime").isna())
+    laps_all["is_pit"] = pit_mask(laps_all)
 
-    drivers = sorted(laps_all["Driver"].unique().tolist())
+    # Build stint blocks using FastF1 Stint + Compound (if missing, still works)
+    if "Stint" not in laps_all.columns or "Compound" not in laps_all.columns:
+        # fallback: single stint per driver
+        compound = laps_all.groupby("Driver")["Compound"].transform("first") if "Compound" in laps_all.columns else "UNKNOWN"
+        laps_all = laps_all.assign(Stint="NA", Compound=compound)
+
+    # Pace and degradation for every (driver, stint) at once: quick non-pit laps, one grouped fit
+    keys = ["Driver", "Stint", "Compound"]
+    non_pit = laps_all[~laps_all["is_pit"]]
+    quick = quick_laps_by(non_pit, keys, quick_quantile)
+    blocks = (
+        laps_all.groupby(keys, dropna=False)
+        .agg(lap_start=("LapNumber", "min"), lap_end=("LapNumber", "max"))
+        .join(non_pit.groupby(keys, dropna=False).size().rename("non_pit"))
+        .join(quick.groupby(keys, dropna=False)["lap_s"].median().rename("pace"))
+        .join(grouped_linear_fit(quick, keys))
+    )
+    driver_stints = _stint_records(blocks, degradation_threshold_sec_per_lap)
+
+    window_paces = _pit_window_paces(laps_all)
 
     drivers_out: List[Dict[str, Any]] = []
 
-    # Build stint blocks using FastF1 Stint + Compound (if missing, still works)
-    for d in drivers:
-        dlaps = laps_all[laps_all["Driver"] == d].copy()
-        if dlaps.empty:
-            continue
-
+    for d, dlaps in laps_all.groupby("Driver", sort=True):
         pit_laps = _pit_laps(dlaps)
 
-        stints: List[Dict[str, Any]] = []
-        if "Stint" in dlaps.columns and "Compound" in dlaps.columns:
-            grouped = dlaps.groupby(["Stint", "Compound"], dropna=False)
-        else:
-            # fallback: single stint
-            grouped = [(("NA", dlaps.get("Compound", pd.Series(["UNKNOWN"])).iloc[0] if "Compound" in dlaps.columns else "UNKNOWN"), dlaps)]
-
-        for (stint_no, compound), g in grouped:
-            g = g.sort_values("LapNumber").copy()
-            lap_start = int(g["LapNumber"].min())
-            lap_end = int(g["LapNumber"].max())
-
-            # Remove pit laps for analysis
-            g2 = g[~g["is_pit"]].copy()
-            pace = _stint_pace(g2, q=quick_quantile)
-
-            # Degradation slope (sec/lap) quick-laps linear fit
-            slope = None
-            r2 = None
-            if g2.shape[0] >= 5:
-                gq = _quick_laps(g2, q=quick_quantile)
-                if gq.shape[0] >= 5:
-                    x = gq["LapNumber"].to_numpy(dtype=float)
-                    y = gq["lap_s"].to_numpy(dtype=float)
-                    a, b = np.polyfit(x, y, 1)
-                    yhat = a * x + b
-                    ss_res = float(np.sum((y - yhat) ** 2))
-                    ss_tot = float(np.sum((y - float(np.mean(y))) ** 2))
-                    r2 = 1.0 - ss_res / ss_tot if ss_tot > 0 else 0.0
-                    slope = float(a)
-
-            # Suggested pit window for this stint if degradation is high
-            pit_window = None
-            if slope is not None and slope >= degradation_threshold_sec_per_lap:
-                # simple: suggest middle-to-late part of stint
-                pit_window = {
-                    "from_lap": max(lap_start, int(lap_start + (lap_end - lap_start) * 0.55)),
-                    "to_lap": max(lap_start, int(lap_start + (lap_end - lap_start) * 0.85)),
-                    "reason": f"Degradation slope {slope:.3f} sec/lap exceeds threshold {degradation_threshold_sec_per_lap:.3f}",
-                }
-
-            stints.append(
-                {
-                    "stint": None if pd.isna(stint_no) else int(stint_no) if str(stint_no).isdigit() else str(stint_no),
-                    "compound": str(compound),
-                    "lap_start": lap_start,
-                    "lap_end": lap_end,
-                    "pace_median_quick_s": pace,
-                    "deg_slope_sec_per_lap": slope,
-                    "deg_r2": r2,
-                    "suggested_pit_window": pit_window,
-                }
-            )
-
-        stints.sort(key=lambda s: s["lap_start"])
+        stints = driver_stints.get(d, [])
 
         # Undercut/Overcut heuristic around each pit lap:
         # Compare median lap_s in 3 laps before pit vs 3 laps after pit (excluding pit laps)
         battles = []
         for plap in pit_laps:
-            pre = dlaps[(dlaps["LapNumber"] >= plap - 3) & (dlaps["LapNumber"] <= plap - 1) & (~dlaps["is_pit"])]
-            post = dlaps[(dlaps["LapNumber"] >= plap + 1) & (dlaps["LapNumber"] <= plap + 3) & (~dlaps["is_pit"])]
-
-            pre_pace = _stint_pace(pre, q=1.0)  # already short window; no quantile filter
-            post_pace = _stint_pace(post, q=1.0)
+            pre_pace = window_paces.get((d, plap, "pre"))
+            post_pace = window_paces.get((d, plap, "post"))
 
             delta = None
             if pre_pace is not None and post_pace is not None:
@@ -183,7 +197,7 @@ def compute_strategy_intelligence(
         "params": {
             "degradation_threshold_sec_per_lap": degradation_threshold_sec_per_lap,
             "quick_quantile": quick_quantile,
-            "pit_effect_window_laps": 3,
+            "pit_effect_window_laps": PIT_EFFECT_WINDOW_LAPS,
         },
         "drivers": drivers_out,
         "message": "Strategy intelligence computed (v1)",
@@ -1,15 +1,13 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional
 
 import numpy as np
 import pandas as pd
-import fastf1
 
-
-# IMPORTANT: use project cache directory
-fastf1.Cache.enable_cache("cache")
+from app.services._lap_stats import grouped_linear_fit, lap_seconds, nullable, pit_mask, quick_laps_by
+from app.services._session_cache import get_loaded_session
 
 
 @dataclass
@@ -25,28 +23,6 @@ class StintDegradation:
     message: str
 
 
-def _to_seconds(td) -> float:
-    # fastf1 uses pandas Timedelta; sometimes returns NaT
-    if pd.isna(td):
-        return float("nan")
-    return pd.to_timedelta(td).total_seconds()
-
-
-def _linear_fit(x: np.ndarray, y: np.ndarray) -> Tuple[float, float, float]:
-    """
-    Fit y = a*x + b
-    Returns (a, b, r2)
-    """
-    if len(x) < 2:
-        return 0.0, float(y.mean()) if len(y) else 0.0, 0.0
-    a, b = np.polyfit(x, y, 1)
-    y_hat = a * x + b
-    ss_res = float(np.sum((y - y_hat) ** 2))
-    ss_tot = float(np.sum((y - float(np.mean(y))) ** 2))
-    r2 = 1.0 - ss_res / ss_tot if ss_tot > 0 else 0.0
-    return float(a), float(b), float(r2)
-
-
 def compute_tyre_degradation(
     season: int,
     round_no: int,
@@ -54,6 +30,7 @@ def compute_tyre_degradation(
     driver: str,
     min_laps: int = 5,
     quick_quantile: float = 0.75,
+    session=None,
 ) -> Dict[str, Any]:
     """
     For a given driver + session:
@@ -61,10 +38,13 @@ def compute_tyre_degradation(
     - filter out in/out laps + slow laps using quantile threshold per stint
     - compute degradation slope (sec/lap) using linear regression
     """
-    session = fastf1.get_session(season, round_no, session_code)
-    session.load(weather=False, telemetry=False, messages=False)
+    if session is None:
+        session = get_loaded_session(season, round_no, session_code)
 
-    laps = session.laps.pick_driver(driver).copy()
+    # Only the columns used below, so the copy (and the NaN fill for missing ones) stays small
+    needed = ["LapNumber", "LapTime", "Compound", "Stint", "PitInTime", "PitOutTime"]
+    laps = session.laps.pick_driver(driver)
+    laps = laps[[c for c in needed if c in laps.columns]].copy()
     if laps.empty:
         return {
             "season": season,
@@ -76,14 +56,13 @@ def compute_tyre_degradation(
         }
 
     # Ensure needed columns exist
-    needed = ["LapNumber", "LapTime", "Compound", "Stint", "PitInTime", "PitOutTime"]
     for c in needed:
         if c not in laps.columns:
             # Don't hard fail; FastF1 can vary
             laps[c] = np.nan
 
     # Compute lap time in seconds
-    laps["lap_s"] = laps["LapTime"].apply(_to_seconds)
+    laps["lap_s"] = lap_seconds(laps["LapTime"])
 
     # Drop obviously invalid laps
     laps = laps.dropna(subset=["LapNumber", "lap_s", "Compound"])
@@ -99,76 +78,55 @@ def compute_tyre_degradation(
 
     # Identify "in/out" style laps: if PitInTime or PitOutTime exists on that lap, drop from analysis
     # (We still keep the stint boundaries using LapNumber range)
-    laps["is_pit"] = (~laps["PitInTime"].isna()) | (~laps["PitOutTime"].isna())
-
-    stints_out: List[Dict[str, Any]] = []
+    laps["is_pit"] = pit_mask(laps)
 
     # Group by Stint + Compound (stint is stable in race; in quali it still helps)
-    grouped = laps.groupby(["Stint", "Compound"], dropna=False)
-
-    for (stint_no, compound), g in grouped:
-        g = g.sort_values("LapNumber").copy()
-        lap_start = int(g["LapNumber"].min())
-        lap_end = int(g["LapNumber"].max())
-
-        # analysis subset: remove pit laps
-        g2 = g[~g["is_pit"]].copy()
-        if g2.empty:
-            stints_out.append(
-                {
-                    "compound": str(compound),
-                    "lap_start": lap_start,
-                    "lap_end": lap_end,
-                    "laps_used": 0,
-                    "best_lap_s": None,
-                    "slope_sec_per_lap": None,
-                    "r2": None,
-                    "message": "No non-pit laps available for this stint",
-                }
-            )
-            continue
-
-        # quick laps filter (remove the slow tail)
-        thresh = float(g2["lap_s"].quantile(quick_quantile))
-        g2 = g2[g2["lap_s"] <= thresh].copy()
-
-        if len(g2) < min_laps:
-            stints_out.append(
-                {
-                    "compound": str(compound),
-                    "lap_start": lap_start,
-                    "lap_end": lap_end,
-                    "laps_used": int(len(g2)),
-                    "best_lap_s": float(g["lap_s"].min()),
-                    "slope_sec_per_lap": None,
-                    "r2": None,
-                    "message": f"Not enough quick laps for fit (need {min_laps}, got {len(g2)})",
-                }
-            )
-            continue
-
-        x = g2["LapNumber"].to_numpy(dtype=float)
-        y = g2["lap_s"].to_numpy(dtype=float)
-
-        a, b, r2 = _linear_fit(x, y)
-        best_lap = float(g["lap_s"].min())
-
-        stints_out.append(
-            {
-                "compound": str(compound),
-                "lap_start": lap_start,
-                "lap_end": lap_end,
-                "laps_used": int(len(g2)),
-                "best_lap_s": best_lap,
-                "slope_sec_per_lap": float(a),
-                "intercept_s": float(b),
-                "r2": float(r2),
-                "message": "OK",
-            }
-        )
+    keys = ["Stint", "Compound"]
+    blocks = laps.groupby(keys, dropna=False).agg(
+        lap_start=("LapNumber", "min"), lap_end=("LapNumber", "max"), best_lap_s=("lap_s", "min")
+    )
+
+    # analysis subset: remove pit laps, then the slow tail per stint, and fit every stint in one pass
+    non_pit = laps[~laps["is_pit"]]
+    quick = quick_laps_by(non_pit, keys, quick_quantile)
+    blocks = blocks.join(non_pit.groupby(keys, dropna=False).size().rename("non_pit")).join(
+        grouped_linear_fit(quick, keys)
+    )
+    blocks[["non_pit", "n"]] = blocks[["non_pit", "n"]].fillna(0)
 
     # Sort stints by lap_start
-    stints_out.sort(key=lambda s: (s["lap_start"], s["compound"]))
+    blocks = blocks.reset_index()
+    blocks["compound"] = blocks["Compound"].astype(str)
+    blocks = blocks.sort_values(["lap_start", "compound"], kind="stable")
+
+    has_laps = (blocks["non_pit"] > 0).to_numpy()
+    laps_used = blocks["n"].astype(int).where(has_laps, 0)
+    ok = has_laps & (laps_used >= min_laps).to_numpy()
+    message = [
+        "OK" if fit else f"Not enough quick laps for fit (need {min_laps}, got {used})" if any_laps
+        else "No non-pit laps available for this stint"
+        for fit, any_laps, used in zip(ok.tolist(), has_laps.tolist(), laps_used.tolist())
+    ]
+
+    stints = pd.DataFrame(
+        {
+            "compound": blocks["compound"],
+            "lap_start": blocks["lap_start"].astype(int),
+            "lap_end": blocks["lap_end"].astype(int),
+            "laps_used": laps_used,
+            "best_lap_s": nullable(blocks["best_lap_s"].where(has_laps)),
+            "slope_sec_per_lap": nullable(blocks["slope"].where(ok)),
+            "intercept_s": nullable(blocks["intercept"].where(ok)),
+            "r2": nullable(blocks["r2"].where(ok)),
+            "message": message,
+        },
+        index=blocks.index,
+    )
+    # only fitted stints report an intercept
+    stints_out: List[Dict[str, Any]] = [
+        rec if fit else {k: v for k, v in rec.items() if k != "intercept_s"}
+        for rec, fit in zip(stints.to_dict("records"), ok.tolist())
+    ]
 
     return {
         "season": season,
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 from typing import Any, Dict, List
-import fastf1
 
-# Cache so FastF1 doesn't re-download every time
-fastf1.Cache.enable_cache("cache")
+import numpy as np
+import pandas as pd
+
+from app.services._session_cache import get_loaded_session
+
 
 # FastF1 compound names vary a bit; normalize them
 def normalize_compound(raw: str) -> str:
@@ -22,13 +24,13 @@ def normalize_compound(raw: str) -> str:
     return "UNKNOWN"
 
 
-def load_tyre_stints(season: int, round_no: int, session_code: str) -> Dict[str, Any]:
+def load_tyre_stints(season: int, round_no: int, session_code: str, session=None) -> Dict[str, Any]:
     """
     Returns per-driver tyre stints with compound + lap ranges + pit laps.
     Works best for Race (R), but also usable for practice/qualifying if tyre data exists.
     """
-    session = fastf1.get_session(season, round_no, session_code)
-    session.load(telemetry=False, weather=False, messages=False)
+    if session is None:
+        session = get_loaded_session(season, round_no, session_code)
 
     laps = session.laps
     if laps is None or laps.empty:
@@ -42,46 +44,47 @@ def load_tyre_stints(season: int, round_no: int, session_code: str) -> Dict[str,
 
     # Keep only rows with driver + lap number
     cols = [c for c in ["Driver", "LapNumber", "Compound", "TyreLife", "PitInTime", "PitOutTime"] if c in laps.columns]
-    laps = laps[cols].dropna(subset=["Driver", "LapNumber"]).copy()
+    laps = laps[cols].dropna(subset=["Driver", "LapNumber"])
 
     drivers_out: List[Dict[str, Any]] = []
 
-    for drv in sorted(laps["Driver"].unique()):
-        d = laps[laps["Driver"] == drv].sort_values("LapNumber").copy()
-
-        # Compound fallback if missing
-        if "Compound" not in d.columns:
-            d["Compound"] = "UNKNOWN"
-
-        d["CompoundNorm"] = d["Compound"].astype(str).map(normalize_compound)
-
-        stints: List[Dict[str, Any]] = []
-        current = None
-
-        for _, row in d.iterrows():
-            lap_no = int(row["LapNumber"])
-            comp = row["CompoundNorm"]
-
-            pit_in = bool("PitInTime" in d.columns and row.get("PitInTime") is not None)
-            # Start new stint if compound changes OR we have no stint yet
-            if current is None or comp != current["compound"]:
-                if current is not None:
-                    stints.append(current)
-                current = {
-                    "compound": comp,
-                    "lap_start": lap_no,
-                    "lap_end": lap_no,
-                    "pit_lap": None,
-                }
-            else:
-                current["lap_end"] = lap_no
-
-            # Mark pit lap if present (race sessions)
-            if pit_in and current is not None:
-                current["pit_lap"] = lap_no
-
-        if current is not None:
-            stints.append(current)
+    # Compound fallback if missing
+    if "Compound" not in laps.columns:
+        laps["Compound"] = "UNKNOWN"
+    # Normalize each distinct compound string once, then index by the factorized codes
+    codes, uniques = pd.factorize(laps["Compound"])
+    lookup = np.array([normalize_compound(str(c)) for c in uniques] + ["UNKNOWN"], dtype=object)
+    laps["CompoundNorm"] = lookup[codes]  # code -1 (missing) hits the trailing "UNKNOWN"
+
+    # Sort once; groupby keeps each driver's laps in this order
+    laps = laps.sort_values("LapNumber", kind="stable")
+
+    for drv, d in laps.groupby("Driver", sort=True):
+        # Run-length encode compound changes: every change starts a new stint
+        stint_id = d["CompoundNorm"].ne(d["CompoundNorm"].shift()).cumsum()
+        if "PitInTime" in d.columns:
+            # Mark pit lap if present (race sessions); the last one in the stint wins
+            pit_lap = d["LapNumber"].where(d["PitInTime"].notna())
+        else:
+            pit_lap = pd.Series(np.nan, index=d.index)
+        agg = d.assign(pit_lap=pit_lap).groupby(stint_id, sort=False).agg(
+            compound=("CompoundNorm", "first"),
+            lap_start=("LapNumber", "min"),
+            lap_end=("LapNumber", "max"),
+            pit_lap=("pit_lap", "max"),
+        )
+
+        stints: List[Dict[str, Any]] = [
+            {
+                "compound": comp,
+                "lap_start": int(start),
+                "lap_end": int(end),
+                "pit_lap": None if np.isnan(pit) else int(pit),
+            }
+            for comp, start, end, pit in zip(
+                agg["compound"].tolist(), agg["lap_start"].tolist(), agg["lap_end"].tolist(), agg["pit_lap"].tolist()
+            )
+        ]
 
         drivers_out.append(
             {
@@ -1,14 +1,26 @@
 from __future__ import annotations
 
-from typing import Dict, Any, List
-from pathlib import Path
-import json
+from typing import Dict, Any, List, Tuple
 
-import fastf1
-import pandas as pd
+import numpy as np
 
+from app.core.disk_cache import cache_path, dump_pickle, is_miss, load_pickle, season_max_age
+from app.services._session_cache import get_loaded_session
 
-TEI_CACHE_DIR = Path(__file__).resolve().parents[3] / "data" / "processed" / "tei"
+
+def _bucket_medians(bucket: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Median of `values` per integer bucket, returned in ascending bucket order.
+    Sorting by (bucket, value) once puts each bucket's middle element(s) at known
+    offsets, so no per-group iteration is needed.
+    """
+    order = np.lexsort((values, bucket))
+    bucket = bucket[order]
+    values = values[order]
+    buckets, start, count = np.unique(bucket, return_index=True, return_counts=True)
+    lo = values[start + (count - 1) // 2]
+    hi = values[start + count // 2]
+    return buckets, (lo + hi) / 2.0
 
 
 def load_weather_and_tei(season: int, round: int, session_name: str) -> Dict[str, Any]:
@@ -18,15 +30,16 @@ def load_weather_and_tei(season: int, round: int, session_name: str) -> Dict[str
     Improvements vs v1:
     - Apply a global "quick lap" threshold before bucketing to avoid slow-lap contamination.
     """
-    TEI_CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    cache_path = TEI_CACHE_DIR / f"weather_tei_{season}_{round}_{session_name}.json"
+    # Binary pickle in the derived-data cache: no float -> decimal text round trip
+    path = cache_path("weather_tei", season, round, session_name)
 
     # Return cached result if exists
-    if cache_path.exists():
-        return json.loads(cache_path.read_text())
+    cached = load_pickle(path, season_max_age(season))
+    if not is_miss(cached):
+        return cached
 
-    session = fastf1.get_session(season, round, session_name)
-    session.load(weather=True, laps=True)
+    # loaded only on a cache miss, from the same parsed session the other analysis services share
+    session = get_loaded_session(season, round, session_name)
 
     # -----------------------
     # Weather
@@ -34,10 +47,8 @@ def load_weather_and_tei(season: int, round: int, session_name: str) -> Dict[str
     weather_records: List[Dict[str, Any]] = []
     w = session.weather_data
     if w is not None and not w.empty:
-        wdf = w.copy()
-        wdf["Time"] = wdf["Time"].astype(str)
         cols = ["Time", "AirTemp", "TrackTemp", "Rainfall", "WindSpeed", "WindDirection"]
-        weather_records = wdf[cols].to_dict(orient="records")
+        weather_records = w[cols].assign(Time=w["Time"].astype(str)).to_dict(orient="records")
 
     # -----------------------
     # TEI
@@ -52,13 +63,18 @@ def load_weather_and_tei(season: int, round: int, session_name: str) -> Dict[str
             "tei": [],
             "message": "No lap data available to compute TEI"
         }
-        cache_path.write_text(json.dumps(out))
+        dump_pickle(path, out)
         return out
 
-    df = laps[["Time", "LapTime", "PitInTime", "PitOutTime", "IsAccurate"]].copy()
-    df = df[df["LapTime"].notna()]
-    df = df[df["IsAccurate"] == True]
-    df = df[df["PitInTime"].isna() & df["PitOutTime"].isna()]
+    # One mask, and only the two columns used below, instead of a chain of filtered copies
+    clean = (
+        laps["LapTime"].notna()
+        & laps["Time"].notna()
+        & laps["IsAccurate"].eq(True)
+        & laps["PitInTime"].isna()
+        & laps["PitOutTime"].isna()
+    )
+    df = laps.loc[clean, ["Time", "LapTime"]]
 
     if df.empty:
         out = {
@@ -69,18 +85,20 @@ def load_weather_and_tei(season: int, round: int, session_name: str) -> Dict[str
             "tei": [],
             "message": "No clean laps available to compute TEI"
         }
-        cache_path.write_text(json.dumps(out))
+        dump_pickle(path, out)
         return out
 
-    df["lap_s"] = df["LapTime"].dt.total_seconds()
-    df["t_s"] = df["Time"].dt.total_seconds()
+    lap_s = df["LapTime"].dt.total_seconds().to_numpy(dtype=np.float64)
+    t_s = df["Time"].dt.total_seconds().to_numpy(dtype=np.float64)
 
     # Global quick-lap filter (removes very slow laps)
-    # Keep fastest 60% laps globally
-    global_q = float(df["lap_s"].quantile(0.60))
-    df = df[df["lap_s"] <= global_q]
+    # Keep fastest 60% laps globally; np.quantile selects by partition (O(n)) with
+    # the same linear interpolation as pandas, and we mask the raw arrays once
+    quick = lap_s <= np.quantile(lap_s, 0.60)
+    lap_s = lap_s[quick]
+    t_s = t_s[quick]
 
-    if df.empty:
+    if lap_s.size == 0:
         out = {
             "season": season,
             "round": round,
@@ -89,27 +107,22 @@ def load_weather_and_tei(season: int, round: int, session_name: str) -> Dict[str
             "tei": [],
             "message": "After quick-lap filtering, no laps remain for TEI"
         }
-        cache_path.write_text(json.dumps(out))
+        dump_pickle(path, out)
         return out
 
     bucket_s = 60.0
-    df["bucket"] = (df["t_s"] // bucket_s).astype(int)
-
-    global_best = float(df["lap_s"].min())
+    bucket = (t_s // bucket_s).astype(np.int64)
 
-    tei_rows: List[Dict[str, Any]] = []
-    for b, g in df.groupby("bucket"):
-        # representative time in this bucket = median lap time
-        median_lap = float(g["lap_s"].median())
-        tei = float(global_best / median_lap)
+    global_best = float(lap_s.min())
 
-        tei_rows.append({
-            "t_s": float(b * bucket_s),
-            "median_lap_s": median_lap,
-            "tei": tei
-        })
+    # representative time in each bucket = median lap time
+    buckets, median_lap = _bucket_medians(bucket, lap_s)
+    tei = global_best / median_lap
 
-    tei_rows.sort(key=lambda x: x["t_s"])
+    tei_rows: List[Dict[str, Any]] = [
+        {"t_s": t, "median_lap_s": m, "tei": v}
+        for t, m, v in zip((buckets * bucket_s).tolist(), median_lap.tolist(), tei.tolist())
+    ]
 
     out = {
         "season": season,
@@ -120,5 +133,5 @@ def load_weather_and_tei(season: int, round: int, session_name: str) -> Dict[str
         "message": "Weather + TEI computed (v1.1)"
     }
 
-    cache_path.write_text(json.dumps(out))
+    dump_pickle(path, out)
     return out
@@ -0,0 +1,19 @@
+"""
+Production server config:
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Run from backend/ (cache paths in the app are relative to it).
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+
+# UvicornWorker runs with loop="auto" / http="auto", which select uvloop and
+# httptools since both are in requirements.txt
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# cold fastf1 loads can take a while on the first request for a session
+timeout = 120